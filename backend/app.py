@@ -1,7 +1,18 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-from chat_flow_handler import ChatFlowHandler
+from chat_flow_handler import ChatFlowHandler, imgflip_api, run_async
+from meme_cache import MEME_CACHE_VARIETIES
+from ingestion_jobs import IngestionQueue, create_job_store
+from config import Config
+import base64
+import io
+import json
 import os
+import tempfile
+import threading
+import uuid
+import zipfile
+from urllib.parse import quote
 import awsgi 
 
 app = Flask(__name__)
@@ -19,9 +30,27 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Origin')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Template-Explanation,X-Template-Format')
     return response
 
-chat_handler = ChatFlowHandler()
+chat_handler: ChatFlowHandler = None
+ingestion_queue: IngestionQueue = None
+
+def init_app() -> None:
+    """Create the chat handler and ingestion queue and start the warm-ups"""
+    global chat_handler, ingestion_queue
+    chat_handler = ChatFlowHandler()
+    # Background ingestion jobs, so large exports don't hold a request (and the worker) open
+    ingestion_queue = IngestionQueue(chat_handler, create_job_store())
+    # Open existing indexes at startup so the first request doesn't pay for it
+    chat_handler.vector_stores.warm_up()
+    # Pre-fetch popular template images in the background
+    threading.Thread(target=imgflip_api.warm_up, daemon=True).start()
+
+# Render workers are spawned processes that re-import this module as __mp_main__;
+# they only render, so they skip the startup
+if __name__ != "__mp_main__":
+    init_app()
 
 @app.route('/api/ping', methods=['GET', 'OPTIONS'])
 def ping():
@@ -31,9 +60,26 @@ def ping():
         'message': 'pong'
     }), 200
 
+def chat_summary(chat_id: str, senders: list) -> dict:
+    """Chat ID, senders and group name of an ingested chat"""
+    ## remove the last sender
+    group_name = senders[-1] if senders else ''
+    senders = senders[:-1]
+    
+    print(f"Senders: {senders}")
+    return {
+        'chat_id': chat_id,
+        'senders': senders,
+        'group_name': group_name
+    }
+
 @app.route('/api/ingest-chat', methods=['POST'])
 def ingest_chat():
-    """Endpoint to ingest a chat file"""
+    """
+    Endpoint to ingest a chat file. By default the chat is ingested in the
+    background and a job ID to poll /api/ingest-status/<job_id> is returned;
+    with async=false the request waits for the ingestion.
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -41,35 +87,100 @@ def ingest_chat():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    # Save the uploaded file temporarily
-    temp_path = 'temp_chat.txt'
-    file.save(temp_path)
-    
-    # Process the chat file
-    success = chat_handler.process_uploaded_chat(temp_path)
+    # Process the chat file, re-uploads of a known chat only index new messages
+    incremental = request.form.get('incremental', str(Config.INGEST_INCREMENTAL)).lower() == 'true'
+    if request.form.get('async', str(Config.INGEST_ASYNC)).lower() == 'true':
+        # The job outlives the request, so the upload is kept as sent (a .zip
+        # stays compressed) in a file of its own and removed once ingested
+        os.makedirs(Config.INGEST_UPLOAD_PATH, exist_ok=True)
+        suffix = '.zip' if file.filename.lower().endswith('.zip') else '.txt'
+        fd, upload_path = tempfile.mkstemp(suffix=suffix, dir=Config.INGEST_UPLOAD_PATH)
+        os.close(fd)
+        file.save(upload_path)
+        job_id = ingestion_queue.submit(upload_path, incremental=incremental)
+        return jsonify({
+            'message': 'Chat ingestion started',
+            'job_id': job_id,
+            'status_url': f'/api/ingest-status/{job_id}'
+        }), 202
     
-    # Clean up
-    if os.path.exists(temp_path):
-        os.remove(temp_path)
+    # Parse straight from the request stream, without copying the upload
+    chat_id = chat_handler.process_uploaded_chat(file.stream, incremental=incremental)
     
-    if success:
-        senders = chat_handler.get_senders()
-        ## remove the last sender
-        group_name = senders[-1]
-        senders = senders[:-1]
-        
-        
-        
-        print(f"Senders: {senders}")
+    if chat_id:
         return jsonify({
             'message': 'Chat processed successfully',
-            'senders': senders,
-            'group_name': group_name
+            **chat_summary(chat_id, chat_handler.get_senders(chat_id))
         }), 200
 
     else:
         return jsonify({'error': 'Failed to process chat'}), 500
 
+@app.route('/api/ingest-status/<job_id>', methods=['GET'])
+def ingest_status(job_id):
+    """
+    Status of a background ingestion job: queued, running, done or failed,
+    with the last stage reached (parsed, chunked, embedding, indexed) and its
+    progress, e.g. {"embedded": 300, "total": 1200} while embedding
+    """
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    
+    response = {
+        'job_id': job_id,
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'error': job['error']
+    }
+    if job['status'] == 'done':
+        response.update(message='Chat processed successfully', **chat_summary(job['chat_id'], job['senders']))
+    return jsonify(response), 200
+
+MEME_RESPONSE_MODES = ('hex', 'base64', 'binary', 'multipart')
+
+def meme_response(result: dict, response_mode: str) -> Response:
+    """
+    Build the /api/generate-meme response in the requested mode:
+      - hex: JSON with the image hex-encoded in image_data (legacy)
+      - base64: JSON with the image base64-encoded in image_data
+      - binary: the raw image, template explanation/format in percent-encoded headers
+      - multipart: multipart/form-data with a JSON "metadata" part and an "image" part
+    """
+    metadata = {
+        'context_chunks': result['context_chunks'],
+        'template_explanation': result['template_explanation'],
+        'template_format': result['template_format'],
+        'image_mime': result['meme_mime']
+    }
+    image = result['meme_bytes']
+    
+    if response_mode == 'binary':
+        response = Response(image, mimetype=result['meme_mime'])
+        response.headers['X-Template-Explanation'] = quote(result['template_explanation'])
+        response.headers['X-Template-Format'] = quote(result['template_format'])
+        return response
+    
+    if response_mode == 'multipart':
+        boundary = uuid.uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\nContent-Disposition: form-data; name="metadata"\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n\r\n'.encode(),
+            json.dumps(metadata, ensure_ascii=False).encode('utf-8'),
+            f'\r\n--{boundary}\r\nContent-Disposition: form-data; name="image"; '
+            f'filename="meme{result["meme_extension"]}"\r\nContent-Type: {result["meme_mime"]}\r\n\r\n'.encode(),
+            image,
+            f'\r\n--{boundary}--\r\n'.encode()
+        ])
+        return Response(body, content_type=f'multipart/form-data; boundary={boundary}')
+    
+    if response_mode == 'base64':
+        metadata['image_data'] = base64.b64encode(image).decode('ascii')
+    else:
+        metadata['image_data'] = image.hex()  # Include image data in the JSON body
+    return jsonify(metadata)
+
 @app.route('/api/generate-meme', methods=['POST'])
 def generate_meme():
     """Endpoint to generate a meme based on a query"""
@@ -78,38 +189,90 @@ def generate_meme():
         return jsonify({'error': 'No query provided'}), 400
     
     query = data['query']
-    result = chat_handler.generate_meme(query)
+    response_mode = data.get('response_mode', 'hex')
+    if response_mode not in MEME_RESPONSE_MODES:
+        return jsonify({'error': f'Unknown response_mode: {response_mode}'}), 400
+    # Memes for a specific chat; falls back to the most recently ingested chat
+    chat_id = data.get('chat_id')
+    if chat_id and not chat_handler.vector_stores.exists(chat_id):
+        return jsonify({'error': f'Unknown chat: {chat_id}'}), 404
+    # On a cache hit, "text" regenerates the text instead of returning the cached meme
+    variety = data.get('variety', Config.MEME_CACHE_VARIETY)
+    if variety not in MEME_CACHE_VARIETIES:
+        return jsonify({'error': f'Unknown variety: {variety}'}), 400
+    # Async pipeline overlaps retrieval, template fetch and template image prefetch
+    result = run_async(chat_handler.agenerate_meme(query, chat_id=chat_id, variety=variety))
     
     if 'error' in result:
         return jsonify({'error': result['error']}), 500
     
-    # Return both the meme image and context data
-    try:
-        if os.path.exists(result['meme_path']):
-            # Read the image file
-            with open(result['meme_path'], 'rb') as img_file:
-                img_data = img_file.read()
-            
-            # Clean up the image file after reading
-            try:
-                os.remove(result['meme_path'])
-            except Exception as e:
-                print(f"Warning: Could not remove temporary file: {e}")
-            
-            # Prepare the response data
-            response_data = {
-                'context_chunks': result['context_chunks'],
+    return meme_response(result, response_mode)
+
+def memes_zip(results: list) -> Response:
+    """
+    Zip the batch results: one image per successful meme (meme_001.jpg, ...)
+    and a results.json manifest listing every query in order, with its file or error.
+    """
+    buffer = io.BytesIO()
+    manifest = []
+    # Images are already compressed, so they are stored as is
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for number, result in enumerate(results, start=1):
+            if 'error' in result:
+                manifest.append({'query': result['query'], 'error': result['error']})
+                continue
+            file_name = f"meme_{number:03d}{result['meme_extension']}"
+            archive.writestr(file_name, result['meme_bytes'])
+            manifest.append({
+                'query': result['query'],
+                'file': file_name,
+                'template': result['template']['name'],
                 'template_explanation': result['template_explanation'],
                 'template_format': result['template_format'],
-                'image_data': img_data.hex()  # Include image data in the JSON body
-            }
-            
-            return jsonify(response_data)
-        else:
-            return jsonify({'error': f'Image file not found at path: {result["meme_path"]}'}), 500
-    except Exception as e:
-        print(f"Error handling meme file: {str(e)}")
-        return jsonify({'error': f'Failed to process meme: {str(e)}'}), 500
+                'top_text': result['meme_text'].top_text,
+                'bottom_text': result['meme_text'].bottom_text
+            })
+        archive.writestr('results.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+    response = Response(buffer.getvalue(), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename="memes.zip"'
+    return response
+
+@app.route('/api/generate-memes', methods=['POST'])
+def generate_memes():
+    """Endpoint to generate a batch of memes for one chat, returned as a zip"""
+    data = request.get_json()
+    queries = data.get('queries') if data else None
+    if not queries or not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return jsonify({'error': 'No queries provided'}), 400
+    if len(queries) > Config.BATCH_MAX_QUERIES:
+        return jsonify({'error': f'At most {Config.BATCH_MAX_QUERIES} queries per batch'}), 400
+    
+    chat_id = data.get('chat_id')
+    if chat_id and not chat_handler.vector_stores.exists(chat_id):
+        return jsonify({'error': f'Unknown chat: {chat_id}'}), 404
+    variety = data.get('variety', Config.MEME_CACHE_VARIETY)
+    if variety not in MEME_CACHE_VARIETIES:
+        return jsonify({'error': f'Unknown variety: {variety}'}), 400
+    
+    results = run_async(chat_handler.agenerate_memes(queries, chat_id=chat_id, variety=variety))
+    if all('error' in result for result in results):
+        return jsonify({'error': results[0]['error']}), 500
+    return memes_zip(results)
+
+@app.route('/api/chat-stats/<chat_id>', methods=['GET'])
+def chat_stats(chat_id):
+    """Message counts of an ingested chat by sender and type, read from its stored messages"""
+    stats = chat_handler.get_chat_stats(chat_id)
+    if stats is None:
+        return jsonify({'error': f'Unknown chat: {chat_id}'}), 404
+    return jsonify({'chat_id': chat_id, **stats}), 200
+
+@app.route('/api/meme-cache/stats', methods=['GET'])
+def meme_cache_stats():
+    """Hit/miss counters of the generated meme cache"""
+    if chat_handler.meme_cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **chat_handler.meme_cache.stats()}), 200
 
 if __name__ == "__main__":
     app.run(debug=False, host="0.0.0.0", port=8080)
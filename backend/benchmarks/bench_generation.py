@@ -0,0 +1,141 @@
+"""
+Compare the LLM round-trips of the fused and two-step meme generation modes.
+
+Usage:
+    python backend/benchmarks/bench_generation.py [--runs 20] [--latency 0.5] [--ms-per-token 0.2]
+
+A stub chat model stands in for the OpenAI API: every call sleeps for a
+fixed round-trip latency plus a per-token cost for the prompt and the
+completion, and the prompt and completion tokens are counted per mode.
+Only the LLM stages of ChatFlowHandler are run, so the numbers reflect the
+number of calls and the size of what is sent rather than retrieval or
+rendering.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from functools import lru_cache
+from typing import Any, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from chat_flow_handler import ChatFlowHandler
+from imgflip_api import template_digest
+
+TEMPLATES = [
+    {"id": str(181913649 + i), "name": f"Template {i}", "box_count": 2,
+     "url": f"https://i.imgflip.com/{i}.jpg", "width": 600, "height": 600}
+    for i in range(10)
+]
+SELECTION = {
+    "template_id": TEMPLATES[0]["id"],
+    "explanation": "Selected the template because the query suggests a comparison",
+    "typical_format": "Top text: something, Bottom text: the punchline"
+}
+TEXT = {"top_text": "כשדני אומר שהוא בדרך", "bottom_text": "והוא עדיין במקלחת"}
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the model's tokenizer, or about 4 characters per token without it"""
+    encoding = _encoding()
+    return len(encoding.encode(text)) if encoding else max(1, len(text) // 4)
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that answers each prompt type with canned JSON after a simulated delay"""
+
+    latency: float = 0.5
+    ms_per_token: float = 0.2
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        system = messages[0].content
+        if "template_id" in system and "top_text" in system:
+            response = {**SELECTION, **TEXT}
+        elif "template_id" in system:
+            response = SELECTION
+        else:
+            response = TEXT
+        content = json.dumps(response, ensure_ascii=False)
+
+        prompt_tokens = sum(count_tokens(message.content) for message in messages)
+        completion_tokens = count_tokens(content)
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        time.sleep(self.latency + (prompt_tokens + completion_tokens) * self.ms_per_token / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def run_llm_stages(handler: ChatFlowHandler, query: str, context, candidates: str):
+    """The LLM part of ChatFlowHandler.generate_meme for the handler's mode"""
+    if handler.generation_mode == "fused":
+        meme_text = handler.generate_fused_meme(query, context, candidates)
+        return handler._fused_template_data(meme_text), meme_text
+    template_data = handler.select_template(query, context, candidates)
+    template_info = handler._template_info(TEMPLATES[0], template_data)
+    return template_data, handler.generate_meme_text(query, context, template_info)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per LLM round-trip")
+    parser.add_argument("--ms-per-token", type=float, default=0.2)
+    args = parser.parse_args()
+
+    query = "תעשה מם על זה שדני תמיד מאחר"
+    context = [
+        (f"[2024-01-0{i + 1} 20:1{i}:00] דני: אני בדרך, עוד חמש דקות\n" * 8,
+         {"message_count": 8, "start_time": f"2024-01-0{i + 1} 20:10:00"})
+        for i in range(2)
+    ]
+    candidates = template_digest(TEMPLATES)
+
+    print(f"{'mode':<10}{'calls/meme':>12}{'prompt tok':>12}{'output tok':>12}{'median s':>10}")
+    for mode in ("two_step", "fused"):
+        handler = ChatFlowHandler(generation_mode=mode)
+        handler.llm = StubChatModel(latency=args.latency, ms_per_token=args.ms_per_token)
+        # Silence the parser's debug output while timing
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        timings = []
+        try:
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                template_data, meme_text = run_llm_stages(handler, query, context, candidates)
+                timings.append(time.perf_counter() - start)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        assert template_data["template_id"] == SELECTION["template_id"]
+        assert meme_text.top_text == TEXT["top_text"]
+
+        llm = handler.llm
+        print(f"{mode:<10}{llm.calls / args.runs:>12.1f}{llm.prompt_tokens / args.runs:>12.0f}"
+              f"{llm.completion_tokens / args.runs:>12.0f}{statistics.median(timings):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark conversation grouping on millions of synthetic messages.
+
+Usage:
+    python backend/benchmarks/bench_grouping.py [--messages 2000000] [--min-messages 10] [--max-time-gap 30]
+
+Compares grouping message objects into lists (the list-building grouper
+group_messages_by_conversation used to be) with conversation_ranges over an
+array of epoch seconds, and reports the one-off cost of building the
+MessageColumns the ranges index into.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from message_columns import MessageColumns, conversation_ranges
+from whatsapp_handler import WhatsAppMessage
+
+SENDERS = ["דני", "יוסי", "Guy Asulin", "Noa", "+972 50-123-4567"]
+CONTENTS = ["מישהו בא לאכול פיצה היום?", "אני מאחר בעשר דקות", "lol that's amazing", "image omitted"]
+
+
+def synthetic_messages(n: int, seed: int = 0):
+    """Messages in bursts: mostly seconds to minutes apart, with an hours-long gap about 1 in 20"""
+    rng = random.Random(seed)
+    timestamp = datetime(2019, 1, 1, 8, 0, 0)
+    messages = []
+    for _ in range(n):
+        gap = rng.randint(3600, 36000) if rng.random() < 0.05 else rng.randint(1, 600)
+        timestamp += timedelta(seconds=gap)
+        messages.append(WhatsAppMessage(timestamp, rng.choice(SENDERS), rng.choice(CONTENTS)))
+    return messages
+
+
+def group_into_lists(messages, min_messages: int, max_time_gap: int):
+    """The previous list-based grouper: per-message timedelta checks, then a merge pass"""
+    conversations = []
+    current_conversation = []
+    last_timestamp = None
+    for message in messages:
+        if last_timestamp is not None:
+            time_diff = (message.timestamp - last_timestamp).total_seconds() / 60
+            if time_diff > max_time_gap and len(current_conversation) >= min_messages:
+                conversations.append(current_conversation)
+                current_conversation = []
+        current_conversation.append(message)
+        last_timestamp = message.timestamp
+    if len(current_conversation) >= min_messages:
+        conversations.append(current_conversation)
+    elif conversations:
+        conversations[-1].extend(current_conversation)
+
+    processed_conversations = []
+    temp_conversation = []
+    for conv in conversations:
+        temp_conversation.extend(conv)
+        if len(temp_conversation) >= min_messages:
+            processed_conversations.append(temp_conversation)
+            temp_conversation = []
+    if temp_conversation:
+        if processed_conversations:
+            processed_conversations[-1].extend(temp_conversation)
+        elif len(temp_conversation) >= min_messages:
+            processed_conversations.append(temp_conversation)
+    return processed_conversations
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--min-messages", type=int, default=10)
+    parser.add_argument("--max-time-gap", type=int, default=30, help="Minutes")
+    args = parser.parse_args()
+
+    messages = synthetic_messages(args.messages)
+    lists, lists_elapsed = timed(group_into_lists, messages, args.min_messages, args.max_time_gap)
+    columns, columns_elapsed = timed(MessageColumns.from_messages, messages)
+    ranges, ranges_elapsed = timed(conversation_ranges, columns.timestamps, args.min_messages, args.max_time_gap)
+    assert [len(conversation) for conversation in lists] == (ranges[:, 1] - ranges[:, 0]).tolist()
+
+    print(f"Messages:              {args.messages:,}")
+    print(f"Conversations:         {len(ranges):,}")
+    print(f"List grouping:         {lists_elapsed:.3f}s")
+    print(f"conversation_ranges:   {ranges_elapsed:.3f}s ({lists_elapsed / ranges_elapsed:,.0f}x faster)")
+    print(f"Building the columns:  {columns_elapsed:.3f}s (once per ingestion)")
+    print(f"Columns memory:        {(columns.timestamps.nbytes + columns.offsets.nbytes) / 2**20:.1f} MB "
+          f"+ {len(columns.text) / 2**20:.1f} MB of text")
+
+
+if __name__ == "__main__":
+    main()
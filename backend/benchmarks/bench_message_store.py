@@ -0,0 +1,66 @@
+"""
+Benchmark the stored message columns against re-parsing the export.
+
+Usage:
+    python backend/benchmarks/bench_message_store.py [--lines 1000000]
+
+Times, on a synthetic export, parsing it into MessageColumns (what every
+ingestion used to start from) and then, from the columns saved next to the
+index and memory-mapped: chat statistics, sender extraction and re-chunking
+with other parameters.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bench_parser import write_synthetic_export
+from local_ingestion import build_conversation_chunks
+from message_columns import MessageColumns, conversation_ranges, load_columns, message_stats, save_columns
+from whatsapp_handler import WhatsAppMessageHandler
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    handler = WhatsAppMessageHandler()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chat_path = os.path.join(tmp_dir, "_chat.txt")
+        store_path = os.path.join(tmp_dir, "messages")
+        write_synthetic_export(chat_path, args.lines)
+
+        columns, parse_elapsed = timed(lambda: MessageColumns.from_messages(handler.iter_chat_file(chat_path)))
+        _, save_elapsed = timed(save_columns, columns, store_path)
+        del columns
+
+        columns, load_elapsed = timed(load_columns, store_path)
+        stats, stats_elapsed = timed(message_stats, columns)
+        _, senders_elapsed = timed(lambda: sorted(columns.senders))
+        conversations, group_elapsed = timed(conversation_ranges, columns.timestamps, 20, 45)
+        chunks, chunk_elapsed = timed(build_conversation_chunks, columns, conversations, 1000, 100)
+        store_mb = sum(
+            os.path.getsize(os.path.join(store_path, name)) for name in os.listdir(store_path)
+        ) / 2**20
+
+    print(f"Messages:                 {stats['messages']:,} ({store_mb:.1f} MB stored)")
+    print(f"Parse export to columns:  {parse_elapsed:.2f}s")
+    print(f"Save columns:             {save_elapsed * 1000:.0f} ms")
+    print(f"Memory-map columns:       {load_elapsed * 1000:.1f} ms")
+    print(f"Chat statistics:          {stats_elapsed * 1000:.1f} ms")
+    print(f"Senders:                  {senders_elapsed * 1000:.2f} ms")
+    print(f"Regroup (20 msgs, 45 min): {group_elapsed * 1000:.1f} ms ({len(conversations):,} conversations)")
+    print(f"Re-chunk (1000/100):      {chunk_elapsed:.2f}s ({len(chunks):,} chunks)")
+
+
+if __name__ == "__main__":
+    main()
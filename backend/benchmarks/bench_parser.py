@@ -0,0 +1,79 @@
+"""
+Benchmark the streaming WhatsApp export parser on a synthetic export.
+
+Usage:
+    python backend/benchmarks/bench_parser.py [--lines 1000000]
+
+Reports parse throughput (lines/sec) and the peak RSS of the process.
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from whatsapp_handler import WhatsAppMessageHandler
+
+SENDERS = ["דני", "יוסי", "Guy Asulin", "Noa", "+972 50-123-4567"]
+CONTENTS = [
+    "מישהו בא לאכול פיצה היום?",
+    "אני מאחר בעשר דקות",
+    "image omitted",
+    "sticker omitted",
+    "lol that's amazing",
+    "Who's bringing the beer tonight? I can get the snacks",
+]
+
+
+def write_synthetic_export(path: str, n_lines: int, seed: int = 0) -> None:
+    """Write a synthetic export with ~10% continuation lines"""
+    rng = random.Random(seed)
+    timestamp = datetime(2019, 1, 1, 8, 0, 0)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(n_lines):
+            if rng.random() < 0.1:
+                f.write(f"{rng.choice(CONTENTS)}\n")
+                continue
+            timestamp += timedelta(seconds=rng.randint(1, 3600))
+            f.write(
+                f"[{timestamp.strftime('%d/%m/%Y, %H:%M:%S')}] "
+                f"{rng.choice(SENDERS)}: {rng.choice(CONTENTS)}\n"
+            )
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    handler = WhatsAppMessageHandler()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chat_path = os.path.join(tmp_dir, "_chat.txt")
+        write_synthetic_export(chat_path, args.lines)
+        size_mb = os.path.getsize(chat_path) / (1024 * 1024)
+        rss_before = peak_rss_mb()
+
+        start = time.perf_counter()
+        message_count = sum(1 for _ in handler.iter_chat_file(chat_path))
+        elapsed = time.perf_counter() - start
+
+    print(f"Export:     {args.lines:,} lines ({size_mb:.1f} MB)")
+    print(f"Messages:   {message_count:,}")
+    print(f"Elapsed:    {elapsed:.2f}s")
+    print(f"Throughput: {args.lines / elapsed:,.0f} lines/sec")
+    print(f"Peak RSS:   {peak_rss_mb():.1f} MB (before parse: {rss_before:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark of per-meme render time.
+
+Usage:
+    python backend/benchmarks/bench_render.py [--font PATH] [--template PATH] [--runs 20]
+
+Compares the font-size search used by MemeGenerator against the previous
+linear search (one font load and two measurements per size from 1 upwards),
+the single-pass stroked captions and cached text layers against the previous
+five draw.text passes per line, and memoized RTL shaping against reshaping
+every render. Ends with the per-step timings recorded by the generator.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import arabic_reshaper
+from bidi.algorithm import get_display
+from PIL import Image, ImageDraw, ImageFont
+from config import Config
+from meme_generator import STROKE_WIDTH, MemeGenerator, _load_font, _text_layer, reshape_rtl
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CAPTIONS = [
+    ("טקסט עליון", "טקסט תחתון"),
+    ("כשדני אומר שהוא בדרך", "והוא עדיין במקלחת"),
+    ("טקסט עליוןעליוןעליוןעליוןעליוןעליון", "טקסט תחתוןתחתוןתחתוןתחתוןתחתון"),
+]
+
+
+def linear_font_size(font_path, top_text, bottom_text, width, height, draw,
+                     max_width_ratio=0.9, top_bottom_margin_ratio=0.1):
+    """The original linear search, kept as the baseline"""
+    max_text_width = width * max_width_ratio
+    vertical_space = height * (1 - 2 * top_bottom_margin_ratio)
+    font_size, best_size, gap = 1, 1, 10
+    while True:
+        font = ImageFont.truetype(font_path, font_size)
+        top_bbox = draw.textbbox((0, 0), top_text, font=font)
+        bottom_bbox = draw.textbbox((0, 0), bottom_text, font=font)
+        if top_bbox[2] - top_bbox[0] > max_text_width or bottom_bbox[2] - bottom_bbox[0] > max_text_width:
+            break
+        if (top_bbox[3] - top_bbox[1]) + gap + (bottom_bbox[3] - bottom_bbox[1]) > vertical_space:
+            break
+        best_size = font_size
+        font_size += 1
+    return best_size
+
+
+def five_pass_text(draw, x, y, text, font):
+    """The original outline: four offset black passes, then the white fill"""
+    for offset in [(-STROKE_WIDTH, 0), (STROKE_WIDTH, 0), (0, -STROKE_WIDTH), (0, STROKE_WIDTH)]:
+        draw.text((x + offset[0], y + offset[1]), text, font=font, fill="black")
+    draw.text((x, y), text, font=font, fill="white")
+
+
+def time_per_run(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--font", default=os.path.join(BACKEND_DIR, Config.MEME_FONT_PATH))
+    parser.add_argument("--template", default=os.path.join(BACKEND_DIR, "utils", "9au02y.jpg"))
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    generator = MemeGenerator(font_path=args.font, text_layers=False)
+    layered_generator = MemeGenerator(font_path=args.font, text_layers=True)
+    with Image.open(args.template) as img:
+        template = img.convert("RGB")
+    draw = ImageDraw.Draw(template)
+    width, height = template.size
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "meme.jpg")
+        for top_text, bottom_text in CAPTIONS:
+            top, bottom = generator._reshape_rtl(top_text), generator._reshape_rtl(bottom_text)
+            linear_size = linear_font_size(args.font, top, bottom, width, height, draw)
+            size = generator._get_same_font_size(top, bottom, width, height, draw)
+            assert size == linear_size, f"size mismatch: {size} != {linear_size}"
+
+            linear_ms = time_per_run(lambda: linear_font_size(args.font, top, bottom, width, height, draw), args.runs)
+            search_ms = time_per_run(lambda: generator._get_same_font_size(top, bottom, width, height, draw), args.runs)
+            render_ms = time_per_run(
+                lambda: generator.create_meme(args.template, top_text, bottom_text, output_path), args.runs
+            )
+            print(f"size {size:3d}: font search {linear_ms:7.2f} ms -> {search_ms:6.2f} ms, "
+                  f"full render {render_ms:6.2f} ms")
+
+            # Caption drawing alone, both lines at the fitted size
+            font = _load_font(args.font, size)
+            canvas = template.copy()
+            canvas_draw = ImageDraw.Draw(canvas)
+            lines = [(10, 10, top), (10, height // 2, bottom)]
+            five_pass_ms = time_per_run(lambda: [five_pass_text(canvas_draw, x, y, text, font) for x, y, text in lines], args.runs)
+            stroke_ms = time_per_run(lambda: [
+                canvas_draw.text((x, y), text, font=font, fill="white", stroke_width=STROKE_WIDTH, stroke_fill="black")
+                for x, y, text in lines
+            ], args.runs)
+            layer_ms = time_per_run(lambda: MemeGenerator._composite_text(
+                canvas, [(_text_layer(args.font, size, text), x, y) for x, y, text in lines]
+            ), args.runs)
+            render_bytes_ms = time_per_run(lambda: generator.render_meme(args.template, top_text, bottom_text), args.runs)
+            layered_bytes_ms = time_per_run(lambda: layered_generator.render_meme(args.template, top_text, bottom_text), args.runs)
+            unshaped_ms = time_per_run(lambda: get_display(arabic_reshaper.reshape(top_text + bottom_text)), args.runs)
+            shaped_ms = time_per_run(lambda: reshape_rtl(top_text + bottom_text), args.runs)
+            print(f"          shaping: every render {unshaped_ms:6.3f} ms -> memoized {shaped_ms:6.3f} ms")
+            print(f"          captions: 5 passes {five_pass_ms:6.2f} ms -> stroked {stroke_ms:6.2f} ms, "
+                  f"cached layers {layer_ms:6.2f} ms; render_meme {render_bytes_ms:6.2f} ms, "
+                  f"with layers {layered_bytes_ms:6.2f} ms")
+
+
+    print("render steps (mean ms):", ", ".join(
+        f"{step} {stats['mean_ms']:.2f}" for step, stats in generator.timer.summary().items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Load test of meme rendering throughput by number of render workers.
+
+Usage:
+    python backend/benchmarks/load_test_render.py [--font PATH] [--template PATH] [--renders 200]
+
+For each worker count up to the number of cores, submits `--renders` jobs
+at once and reports renders/sec, both for a thread pool in this process
+(bounded by the GIL) and for RenderService worker processes.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from meme_generator import MemeGenerator
+from render_service import RenderService
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CAPTIONS = [
+    ("טקסט עליון", "טקסט תחתון"),
+    ("כשדני אומר שהוא בדרך", "והוא עדיין במקלחת"),
+    ("טקסט עליוןעליוןעליוןעליוןעליוןעליון", "טקסט תחתוןתחתוןתחתוןתחתוןתחתון"),
+]
+
+
+def renders_per_second(submit, renders: int) -> float:
+    start = time.perf_counter()
+    futures = [submit(*CAPTIONS[i % len(CAPTIONS)]) for i in range(renders)]
+    wait(futures)
+    for future in futures:
+        future.result()
+    return renders / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--font", default=os.path.join(BACKEND_DIR, Config.MEME_FONT_PATH))
+    parser.add_argument("--template", default=os.path.join(BACKEND_DIR, "utils", "9au02y.jpg"))
+    parser.add_argument("--renders", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    worker_counts = sorted({1, 2, 4, 8, 16, args.max_workers} & set(range(1, args.max_workers + 1)))
+    generator = MemeGenerator(font_path=args.font)
+    generator.render_meme(args.template, *CAPTIONS[0])  # Warm the in-process caches
+
+    print(f"{'workers':>8}{'threads/s':>12}{'processes/s':>14}")
+    for workers in worker_counts:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            threads = renders_per_second(
+                lambda top, bottom: executor.submit(generator.render_meme, args.template, top, bottom),
+                args.renders
+            )
+
+        service = RenderService(max_workers=workers, font_path=args.font, template_paths=[args.template])
+        try:
+            # Start every worker before timing
+            wait([service.submit(args.template, *CAPTIONS[0]) for _ in range(workers * 2)])
+            processes = renders_per_second(
+                lambda top, bottom: service.submit(args.template, top, bottom),
+                args.renders
+            )
+        finally:
+            service.shutdown()
+        print(f"{workers:>8}{threads:>12.1f}{processes:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
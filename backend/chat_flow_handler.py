@@ -1,21 +1,84 @@
-from local_ingestion import main as process_chat, extract_unique_senders
+from local_ingestion import ingest_chat, reindex_chat
+from message_columns import MESSAGES_DIR, MessageColumns, load_columns, message_stats
+from whatsapp_handler import ChatSource
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
-from meme_parser import MemeOutputParser, MemeFormat
-from meme_generator import MemeGenerator
-from imgflip_api import ImgflipAPI
+from meme_parser import MemeOutputParser, MemeFormat, FusedMemeOutputParser, FusedMemeFormat
+from meme_generator import MemeGenerator, OUTPUT_FORMATS
+from imgflip_api import ImgflipAPI, template_digest
+from template_index import TemplateIndex
+from config import Config
+from vector_store_registry import VectorStoreRegistry, get_shared_registry
+from meme_cache import MemeCache, get_shared_meme_cache
+from render_service import RenderService
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+import asyncio
+import faiss
 import json
+import numpy as np
 import os
-from typing import List
-
-# Constants
-OUTPUT_PATH = "backend/output_meme.jpg"  # Where to save the generated meme
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
 
 # Initialize components
 meme_generator = MemeGenerator()
 imgflip_api = ImgflipAPI()
+# Pool of render worker processes, when enabled with RENDER_WORKERS. Started on
+# the first render: spawned workers re-import the main module, and with it this one.
+_render_service: Optional[RenderService] = None
+_render_service_lock = threading.Lock()
+
+def get_render_service() -> Optional[RenderService]:
+    """Process-wide render worker pool, or None when RENDER_WORKERS is 0"""
+    global _render_service
+    if Config.RENDER_WORKERS <= 0:
+        return None
+    with _render_service_lock:
+        if _render_service is None:
+            _render_service = RenderService(
+                font_path=meme_generator.font_path,
+                template_paths=imgflip_api.cached_image_paths(Config.RENDER_PRELOAD_TEMPLATES)
+            )
+        return _render_service
+
+def render_meme(template_path: str, top_text: str, bottom_text: str) -> bytes:
+    """Render a meme on the render workers if enabled, otherwise in this thread"""
+    render_service = get_render_service()
+    if render_service is not None:
+        return render_service.render(template_path, top_text, bottom_text)
+    return meme_generator.render_meme(template_path, top_text, bottom_text)
+
+async def arender_meme(template_path: str, top_text: str, bottom_text: str, executor: Optional[Executor] = None) -> bytes:
+    """Async render_meme; without render workers the render runs on `executor`"""
+    render_service = get_render_service()
+    if render_service is not None:
+        return await render_service.arender(template_path, top_text, bottom_text)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(meme_generator.render_meme, template_path, top_text, bottom_text))
+
+# Render threads shared by every batch when there are no render worker processes;
+# threads are only started by the first batch render
+batch_render_executor = ThreadPoolExecutor(max_workers=Config.BATCH_RENDER_WORKERS, thread_name_prefix="render")
+
+# Event loop shared by the sync entry points. asyncio.run per call would close
+# the loop the LLM clients' cached async HTTP connections are bound to.
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop, running on a daemon thread"""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="event-loop", daemon=True).start()
+        return _event_loop
+
+def run_async(coroutine):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
 
 # Define the template selection prompt
 template_selection_prompt = ChatPromptTemplate.from_messages([
@@ -76,10 +139,59 @@ meme_text_prompt = ChatPromptTemplate.from_messages([
                 ("human", "Query: {query}")
             ])
 
+# Define the single-call prompt that selects the template and writes its text
+fused_meme_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """You are a skilled meme creator specializing in generating memes from WhatsApp group chat context. Your job is to select the most appropriate meme template from the available templates and write the perfect text for it, using the chat context and the user's query.
+
+            Consider the following when selecting a template:
+            1. The template should match the mood and intent of the query
+            2. The template should be with format of top text and bottom text, dont choose templates that have complex format
+            3. The template should have the right format for the intended joke
+            4. Consider how the template is typically used in meme culture
+
+            Guidelines for the text:
+            1. Follow the typical format of the selected template
+            2. Use the chat context to create relevant humor:
+            - Reference inside jokes and recurring themes
+            - Use group-specific slang and expressions
+            - Reference memorable moments or conversations
+            3. Write in the language of the query
+            4. Keep the text short, punchy, and funny
+            5. Use irony, sarcasm, or local Israeli humor when appropriate
+
+            Your response MUST be a valid JSON object with exactly these fields:
+            - template_id: string ID of the selected template
+            - explanation: brief explanation of why this template was chosen and how it should be used
+            - typical_format: brief description of how text is typically formatted for this template
+            - top_text: string in Hebrew for the top text of the meme
+            - bottom_text: string in Hebrew for the bottom text of the meme
+            ** includ dark and edgy humor, improvise while reflecting the group's tone and personality.**
+            Example response:
+            {{
+                "template_id": "181913649",
+                "explanation": "Selected the Drake template because the query suggests a comparison or preference scenario",
+                "typical_format": "Top text: something, Bottom text: the punchline",
+                "top_text": "הטקסט העליון של המם",
+                "bottom_text": "הטקסט התחתון של המם"
+            }}"""
+                ),
+                ("human", "Available templates: {templates}"),
+                ("human", "Chat context: {context}"),
+                ("human", "Query: {query}")
+            ])
+
 class ChatFlowHandler:
-    def __init__(self):
-        self.vector_store = None
+    def __init__(
+        self,
+        vector_stores: Optional[VectorStoreRegistry] = None,
+        generation_mode: str = Config.MEME_GENERATION_MODE,
+        meme_cache: Optional[MemeCache] = None
+    ):
         self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        # One lazily loaded FAISS index per chat ID, shared by every handler in the process
+        self.vector_stores = vector_stores or get_shared_registry(self.embeddings)
         self.llm = ChatOpenAI(
             temperature=0.4,
             model="gpt-4o-mini",
@@ -87,52 +199,96 @@ class ChatFlowHandler:
             frequency_penalty=0.0,
             response_format={"type": "json_object"}
         )
-        self.unique_senders = []
+        # Local pre-ranking of templates so the LLM only sees the best candidates
+        self.template_index = TemplateIndex(self.embeddings, imgflip_api)
+        if generation_mode not in ("fused", "two_step"):
+            raise ValueError(f"Unknown meme generation mode: {generation_mode!r}")
+        self.generation_mode = generation_mode
+        # Generated memes by chat and query, shared by every handler in the process
+        if meme_cache is None and Config.MEME_CACHE_ENABLED:
+            meme_cache = get_shared_meme_cache(self.embeddings)
+        self.meme_cache = meme_cache
+        self.chat_id = None  # Most recently ingested chat, used when no chat ID is given
+        self.senders_by_chat: Dict[str, List[str]] = {}
+    
+    def ingest_uploaded_chat(
+        self, source: ChatSource, incremental: bool = Config.INGEST_INCREMENTAL,
+        progress: Optional[Callable[[str, Dict], None]] = None
+    ) -> Optional[str]:
+        """
+        Ingest an uploaded chat export (a path or binary file object of the
+        .txt or .zip export), appending only new messages when incremental,
+        and make its index the current one. Returns the chat ID, or None for an
+        empty export; errors are raised. `progress` receives the ingestion stages.
+        """
+        # Process the chat file into its own index
+        chat_id, senders = ingest_chat(source, incremental=incremental, progress=progress)
+        if chat_id is None:
+            return None
+        self.senders_by_chat[chat_id] = senders
+        self.chat_id = chat_id
+        
+        # Reload the vector store with the newly ingested chunks
+        self.vector_stores.invalidate(chat_id)
+        if self.meme_cache is not None:
+            self.meme_cache.invalidate_chat(chat_id)
+        return chat_id if self.load_vector_store(chat_id) else None
     
-    def process_uploaded_chat(self, chat_path: str) -> bool:
-        """Process an uploaded chat file"""
+    def process_uploaded_chat(self, source: ChatSource, incremental: bool = Config.INGEST_INCREMENTAL) -> Optional[str]:
+        """
+        Process an uploaded chat file, appending only new messages when incremental.
+        Returns the chat ID on success and None on failure.
+        """
         try:
-            # Set the chat file path in environment
-            os.environ["CHAT_FILE_PATH"] = chat_path
-            
-            # Process the chat file
-            self.unique_senders = process_chat()
-            
-            # Load the vector store
-            return self.load_vector_store()
+            return self.ingest_uploaded_chat(source, incremental=incremental)
         except Exception as e:
             print(f"Error processing chat: {str(e)}")
-            return False
+            return None
     
-    def load_vector_store(self) -> bool:
-        """Load the FAISS vector store from disk"""
+    def load_vector_store(self, chat_id: Optional[str] = None) -> bool:
+        """Load the chat's FAISS vector store from disk"""
         try:
-            if os.path.exists("backend/vector_store"):
-                self.vector_store = FAISS.load_local(
-                    "backend/vector_store",
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                return True
-            return False
+            chat_id = chat_id or self.chat_id
+            return chat_id is not None and self.vector_stores.get(chat_id) is not None
         except Exception as e:
             print(f"Error loading vector store: {str(e)}")
             return False
     
-    def get_context_for_query(self, query: str, k: int = 2) -> str:
-        """Get relevant context and metadata for a query"""
-        if not self.vector_store:
-            if not self.load_vector_store():
-                return []
+    def get_context_for_query(self, query: str, k: int = 2, chat_id: Optional[str] = None, query_vector: Optional[List[float]] = None) -> str:
+        """Get relevant context and metadata for a query, reusing its embedding when already computed"""
+        chat_id = chat_id or self.chat_id
+        vector_store = self.vector_stores.get(chat_id) if chat_id else None
+        if vector_store is None:
+            return []
         
-        results = self.vector_store.similarity_search_with_score(
-            query,
-            k=k
-        )
+        if query_vector is not None:
+            results = vector_store.similarity_search_with_score_by_vector(query_vector, k=k)
+        else:
+            results = vector_store.similarity_search_with_score(
+                query,
+                k=k
+            )
         return [(doc.page_content, doc.metadata) for doc, score in results]
     
-    def select_template(self, query: str, context: str, templates: list) -> dict:
-        """Select appropriate meme template"""
+    def get_contexts_for_queries(self, query_vectors: List[List[float]], k: int = 2, chat_id: Optional[str] = None) -> List[list]:
+        """get_context_for_query for many embedded queries with a single FAISS search"""
+        chat_id = chat_id or self.chat_id
+        vector_store = self.vector_stores.get(chat_id) if chat_id else None
+        if vector_store is None or not query_vectors:
+            return [[] for _ in query_vectors]
+        
+        matrix = np.asarray(query_vectors, dtype=np.float32)
+        if getattr(vector_store, "_normalize_L2", False):
+            faiss.normalize_L2(matrix)
+        _, indices = vector_store.index.search(matrix, k)
+        contexts = []
+        for row in indices:
+            documents = [vector_store.docstore.search(vector_store.index_to_docstore_id[int(i)]) for i in row if i != -1]
+            contexts.append([(doc.page_content, doc.metadata) for doc in documents])
+        return contexts
+    
+    def select_template(self, query: str, context: str, templates) -> dict:
+        """Select appropriate meme template from a template list or digest"""
         chain = template_selection_prompt | self.llm
         response = chain.invoke({
             "templates": templates,
@@ -141,6 +297,16 @@ class ChatFlowHandler:
         })
         return json.loads(response.content)
     
+    async def aselect_template(self, query: str, context: str, templates) -> dict:
+        """Async version of select_template"""
+        chain = template_selection_prompt | self.llm
+        response = await chain.ainvoke({
+            "templates": templates,
+            "context": context,
+            "query": query
+        })
+        return json.loads(response.content)
+    
     def generate_meme_text(self, query: str, context: str, template_info: str) -> MemeFormat:
         """Generate meme text based on template and context"""
         chain = meme_text_prompt | self.llm | MemeOutputParser()
@@ -151,61 +317,388 @@ class ChatFlowHandler:
         })
         return response
     
-    def generate_meme(self, query: str) -> dict:
-        """Generate a meme based on the query using the chat context"""
+    async def agenerate_meme_text(self, query: str, context: str, template_info: str) -> MemeFormat:
+        """Async version of generate_meme_text"""
+        chain = meme_text_prompt | self.llm | MemeOutputParser()
+        return await chain.ainvoke({
+            "query": query,
+            "context": context,
+            "template_info": template_info
+        })
+    
+    def generate_fused_meme(self, query: str, context: str, templates) -> FusedMemeFormat:
+        """Select a template and generate its text with a single LLM call"""
+        chain = fused_meme_prompt | self.llm | FusedMemeOutputParser()
+        return chain.invoke({
+            "templates": templates,
+            "context": context,
+            "query": query
+        })
+    
+    async def agenerate_fused_meme(self, query: str, context: str, templates) -> FusedMemeFormat:
+        """Async version of generate_fused_meme"""
+        chain = fused_meme_prompt | self.llm | FusedMemeOutputParser()
+        return await chain.ainvoke({
+            "templates": templates,
+            "context": context,
+            "query": query
+        })
+    
+    @staticmethod
+    def _fused_template_data(fused: FusedMemeFormat) -> dict:
+        """Template selection fields of a fused response, shaped like select_template's output"""
+        return {
+            "template_id": fused.template_id,
+            "explanation": fused.explanation,
+            "typical_format": fused.typical_format
+        }
+    
+    def _template_candidates(self, query: str, context) -> Tuple[str, Optional[dict]]:
+        """
+        Pre-rank templates against the query and retrieved context with the local
+        template index. Returns the digest of the top candidates for the LLM and,
+        if the best match is confident enough, a selection that skips the LLM.
+        """
         try:
-            # Get relevant context
-            context = self.get_context_for_query(query)
-            
-            # Get available templates
-            templates = imgflip_api.get_meme_templates()
+            ranked = self.template_index.rank(self._ranking_text(query, context))
+        except Exception as e:
+            print(f"Warning: template pre-ranking failed, offering all templates: {e}")
+            ranked = []
+        return self._candidates_from_ranking(ranked)
+    
+    @staticmethod
+    def _ranking_text(query: str, context) -> str:
+        """Text the templates are ranked against: the query and the start of its context"""
+        context_text = "\n".join(content for content, _ in context)[:2000]
+        return f"{query}\n{context_text}"
+    
+    @staticmethod
+    def _candidates_from_ranking(ranked: List[Tuple[dict, float]]) -> Tuple[str, Optional[dict]]:
+        if not ranked:
+            return imgflip_api.get_template_digest(), None
+        
+        best, best_score = ranked[0]
+        runner_up_score = ranked[1][1] if len(ranked) > 1 else -1.0
+        if (
+            Config.TEMPLATE_AUTO_SELECT_SCORE
+            and best_score >= Config.TEMPLATE_AUTO_SELECT_SCORE
+            and best_score - runner_up_score >= Config.TEMPLATE_AUTO_SELECT_MARGIN
+        ):
+            return template_digest([best]), {
+                "template_id": best["id"],
+                "explanation": f"Closest template to the request by embedding similarity ({best_score:.2f})",
+                "typical_format": "Top text: the setup, Bottom text: the punchline"
+            }
+        return template_digest([template for template, _ in ranked]), None
+    
+    @staticmethod
+    def _resolve_template(template_data: dict) -> dict:
+        """Find the selected template, falling back to the most popular two-box template"""
+        templates = imgflip_api.get_meme_templates()
+        selected = next((t for t in templates if t["id"] == template_data["template_id"]), None)
+        if selected is None:
+            selected = (imgflip_api.get_two_box_templates() or templates)[0]
+        return selected
+    
+    @staticmethod
+    def _template_info(selected_template: dict, template_data: dict) -> str:
+        template_info_str = f"Template name: {selected_template['name']}\nTemplate explanation: {template_data['explanation']}\nTemplate typical format: {template_data['typical_format']}"
+        print(f"Template info: {template_info_str}")
+        return template_info_str
+    
+    @staticmethod
+    def _meme_result(query: str, selected_template: dict, template_data: dict, meme_text: MemeFormat, meme_bytes: bytes, context) -> dict:
+        _, meme_mime, meme_extension = OUTPUT_FORMATS[Config.MEME_OUTPUT_FORMAT.upper()]
+        return {
+            "query": query,
+            "template": selected_template,
+            "template_explanation": template_data["explanation"],
+            "template_format": template_data["typical_format"],
+            "meme_text": meme_text,
+            "meme_bytes": meme_bytes,
+            "meme_mime": meme_mime,
+            "meme_extension": meme_extension,
+            "context_chunks": context
+        }
+    
+    def _cached_meme(self, query: str, chat_id: Optional[str], query_vector: Optional[List[float]] = None) -> Tuple[Optional[dict], Optional[List[float]]]:
+        """Cached result for the query in the chat, and the query embedding computed for the lookup"""
+        if self.meme_cache is None or chat_id is None:
+            return None, query_vector
+        try:
+            cached, query_vector = self.meme_cache.lookup(chat_id, query, query_vector)
+        except Exception as e:
+            print(f"Warning: meme cache lookup failed: {e}")
+            return None, query_vector
+        if cached is not None:
+            cached["query"] = query
+        return cached, query_vector
+    
+    def _cache_meme(self, chat_id: Optional[str], query: str, query_vector: Optional[List[float]], result: dict) -> None:
+        if self.meme_cache is None or chat_id is None:
+            return
+        try:
+            self.meme_cache.put(chat_id, query, query_vector, result)
+        except Exception as e:
+            print(f"Warning: could not cache meme: {e}")
+    
+    @staticmethod
+    def _cached_template_info(cached: dict) -> str:
+        return ChatFlowHandler._template_info(cached["template"], {
+            "explanation": cached["template_explanation"],
+            "typical_format": cached["template_format"]
+        })
+    
+    def _regenerate_text(self, query: str, cached: dict) -> dict:
+        """New text for a cached meme, reusing its retrieved context and template"""
+        meme_text = self.generate_meme_text(query, cached["context_chunks"], self._cached_template_info(cached))
+        template_path = imgflip_api.get_template_image(cached["template"]["url"])
+        meme_bytes = render_meme(template_path, meme_text.top_text, meme_text.bottom_text)
+        return {**cached, "meme_text": meme_text, "meme_bytes": meme_bytes}
+    
+    async def _aregenerate_text(
+        self, query: str, cached: dict,
+        llm_slots: Optional[asyncio.Semaphore] = None, render_executor: Optional[Executor] = None
+    ) -> dict:
+        """Async version of _regenerate_text"""
+        loop = asyncio.get_running_loop()
+        meme_text, template_path = await asyncio.gather(
+            self._limited(self.agenerate_meme_text(query, cached["context_chunks"], self._cached_template_info(cached)), llm_slots),
+            loop.run_in_executor(None, imgflip_api.get_template_image, cached["template"]["url"])
+        )
+        meme_bytes = await arender_meme(template_path, meme_text.top_text, meme_text.bottom_text, render_executor)
+        return {**cached, "meme_text": meme_text, "meme_bytes": meme_bytes}
+    
+    def generate_meme(self, query: str, chat_id: Optional[str] = None, variety: str = Config.MEME_CACHE_VARIETY) -> dict:
+        """
+        Generate a meme based on the query using the context of the given (or last ingested) chat.
+        A cached meme for the same or a similar query is returned as is, or with
+        regenerated text when variety is "text".
+        """
+        try:
+            chat_id = chat_id or self.chat_id
+            cached, query_vector = self._cached_meme(query, chat_id)
+            if cached is not None:
+                return self._regenerate_text(query, cached) if variety == "text" else cached
             
-            # Select template
-            template_data = self.select_template(query, context, templates)
-            selected_template = next(
-                (t for t in templates if t["id"] == template_data["template_id"]),
-                templates[0]
-            )
+            # Get relevant context
+            context = self.get_context_for_query(query, chat_id=chat_id, query_vector=query_vector)
             
-            # Generate meme text
-            template_info = {
-                "name": selected_template["name"],
-                "explanation": template_data["explanation"],
-                "typical_format": template_data["typical_format"]
-            }
-            template_info_str = f"Template name: {template_info['name']}\nTemplate explanation: {template_info['explanation']}\nTemplate typical format: {template_info['typical_format']}"
-            print(f"Template info: {template_info_str}")
-            meme_text = self.generate_meme_text(query, context, template_info_str)
+            # Select template among the locally pre-ranked candidates
+            candidates, template_data = self._template_candidates(query, context)
+            if template_data is None and self.generation_mode == "fused":
+                # One call returns both the template choice and the meme text
+                meme_text = self.generate_fused_meme(query, context, candidates)
+                template_data = self._fused_template_data(meme_text)
+                selected_template = self._resolve_template(template_data)
+            else:
+                if template_data is None:
+                    template_data = self.select_template(query, context, candidates)
+                selected_template = self._resolve_template(template_data)
+                
+                # Generate meme text
+                meme_text = self.generate_meme_text(query, context, self._template_info(selected_template, template_data))
             
-            # Generate meme image
-            template_path = imgflip_api.download_template(selected_template["url"], "temp_template.jpg")
-            meme_path = meme_generator.create_meme(
+            # Generate meme image from the locally cached template
+            template_path = imgflip_api.get_template_image(selected_template["url"])
+            meme_bytes = render_meme(
                 template_path,
                 meme_text.top_text,
-                meme_text.bottom_text,
-                OUTPUT_PATH
+                meme_text.bottom_text
             )
             
-            # Clean up
-            if os.path.exists(template_path):
-                os.remove(template_path)
-            
+            result = self._meme_result(query, selected_template, template_data, meme_text, meme_bytes, context)
+            self._cache_meme(chat_id, query, query_vector, result)
+            return result
+        except Exception as e:
+            print(f"Error generating meme: {str(e)}")
             return {
                 "query": query,
-                "template": selected_template,
-                "template_explanation": template_data["explanation"],
-                "template_format": template_data["typical_format"],
-                "meme_text": meme_text,
-                "meme_path": meme_path,
-                "context_chunks": context
-            }
+                "error": str(e)
+            } 
+    
+    @staticmethod
+    async def _limited(coroutine, slots: Optional[asyncio.Semaphore]):
+        """Await the coroutine holding one of the slots, if any"""
+        if slots is None:
+            return await coroutine
+        async with slots:
+            return await coroutine
+    
+    async def _acompose_meme(
+        self, query: str, context, candidates: str, template_data: Optional[dict],
+        llm_slots: Optional[asyncio.Semaphore] = None, render_executor: Optional[Executor] = None
+    ) -> dict:
+        """
+        Select the template (unless pre-selected), write the text and render the
+        meme. LLM calls hold one of `llm_slots`; renders run on the render workers
+        when enabled, otherwise on `render_executor`.
+        """
+        loop = asyncio.get_running_loop()
+        if template_data is None and self.generation_mode == "fused":
+            meme_text = await self._limited(self.agenerate_fused_meme(query, context, candidates), llm_slots)
+            template_data = self._fused_template_data(meme_text)
+            selected_template = self._resolve_template(template_data)
+            template_path = await loop.run_in_executor(None, imgflip_api.get_template_image, selected_template["url"])
+        else:
+            if template_data is None:
+                template_data = await self._limited(self.aselect_template(query, context, candidates), llm_slots)
+            selected_template = self._resolve_template(template_data)
+            
+            meme_text, template_path = await asyncio.gather(
+                self._limited(self.agenerate_meme_text(query, context, self._template_info(selected_template, template_data)), llm_slots),
+                loop.run_in_executor(None, imgflip_api.get_template_image, selected_template["url"])
+            )
+        
+        meme_bytes = await arender_meme(template_path, meme_text.top_text, meme_text.bottom_text, render_executor)
+        return self._meme_result(query, selected_template, template_data, meme_text, meme_bytes, context)
+    
+    async def agenerate_meme(self, query: str, chat_id: Optional[str] = None, variety: str = Config.MEME_CACHE_VARIETY) -> dict:
+        """
+        Async generate_meme that overlaps independent stages: retrieval runs
+        alongside loading the template catalog and index, and in two-step mode
+        the template image is fetched while the meme text is being generated.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            chat_id = chat_id or self.chat_id
+            cached, query_vector = await loop.run_in_executor(None, self._cached_meme, query, chat_id)
+            if cached is not None:
+                return await self._aregenerate_text(query, cached) if variety == "text" else cached
+            
+            context, _ = await asyncio.gather(
+                loop.run_in_executor(None, partial(self.get_context_for_query, query, chat_id=chat_id, query_vector=query_vector)),
+                loop.run_in_executor(None, self.template_index.ensure_built)
+            )
+            
+            candidates, template_data = await loop.run_in_executor(None, self._template_candidates, query, context)
+            result = await self._acompose_meme(query, context, candidates, template_data)
+            await loop.run_in_executor(None, self._cache_meme, chat_id, query, query_vector, result)
+            return result
         except Exception as e:
             print(f"Error generating meme: {str(e)}")
             return {
                 "query": query,
                 "error": str(e)
-            } 
+            }
+    
+    def generate_memes(
+        self, queries: List[str], chat_id: Optional[str] = None,
+        variety: str = Config.MEME_CACHE_VARIETY, max_concurrency: int = Config.BATCH_LLM_CONCURRENCY
+    ) -> List[dict]:
+        """Generate a meme for each query of the given (or last ingested) chat, see agenerate_memes"""
+        return run_async(self.agenerate_memes(queries, chat_id=chat_id, variety=variety, max_concurrency=max_concurrency))
+    
+    async def agenerate_memes(
+        self, queries: List[str], chat_id: Optional[str] = None,
+        variety: str = Config.MEME_CACHE_VARIETY, max_concurrency: int = Config.BATCH_LLM_CONCURRENCY
+    ) -> List[dict]:
+        """
+        Generate memes for many queries of one chat, sharing the per-call work:
+        all queries are embedded in one request, cache lookups and retrieval
+        reuse those vectors (retrieval as a single FAISS search), templates are
+        ranked with one matrix product, at most `max_concurrency` LLM calls run
+        at a time and renders run on a worker pool.
+        Results are in query order; a failed query's result holds an error.
+        """
+        loop = asyncio.get_running_loop()
+        chat_id = chat_id or self.chat_id
+        queries = list(queries)
+        if not queries:
+            return []
+        try:
+            query_vectors, _ = await asyncio.gather(
+                loop.run_in_executor(None, self.embeddings.embed_documents, queries),
+                loop.run_in_executor(None, self.template_index.ensure_built)
+            )
+        except Exception as e:
+            print(f"Error generating memes: {str(e)}")
+            return [{"query": query, "error": str(e)} for query in queries]
+        
+        lookups = await asyncio.gather(*(
+            loop.run_in_executor(None, self._cached_meme, query, chat_id, vector)
+            for query, vector in zip(queries, query_vectors)
+        ))
+        cached = {i: hit for i, (hit, _) in enumerate(lookups) if hit is not None}
+        pending = [i for i in range(len(queries)) if i not in cached]
+        results: List[Optional[dict]] = [None] * len(queries)
+        
+        try:
+            contexts = await loop.run_in_executor(
+                None, partial(self.get_contexts_for_queries, [query_vectors[i] for i in pending], chat_id=chat_id)
+            )
+        except Exception as e:
+            # Cached memes don't need the chat context
+            print(f"Error generating memes: {str(e)}")
+            for i in pending:
+                results[i] = {"query": queries[i], "error": str(e)}
+            pending, contexts = [], []
+        try:
+            rankings = await loop.run_in_executor(
+                None, self.template_index.rank_many,
+                [self._ranking_text(queries[i], context) for i, context in zip(pending, contexts)]
+            )
+        except Exception as e:
+            print(f"Warning: template pre-ranking failed, offering all templates: {e}")
+            rankings = [[] for _ in pending]
+        
+        llm_slots = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def compose(i: int, context, ranked) -> None:
+            try:
+                candidates, template_data = self._candidates_from_ranking(ranked)
+                result = await self._acompose_meme(queries[i], context, candidates, template_data, llm_slots, render_executor)
+                await loop.run_in_executor(None, self._cache_meme, chat_id, queries[i], query_vectors[i], result)
+                results[i] = result
+            except Exception as e:
+                print(f"Error generating meme: {str(e)}")
+                results[i] = {"query": queries[i], "error": str(e)}
+        
+        async def reuse(i: int, hit: dict) -> None:
+            try:
+                results[i] = await self._aregenerate_text(queries[i], hit, llm_slots, render_executor) if variety == "text" else hit
+            except Exception as e:
+                print(f"Error generating meme: {str(e)}")
+                results[i] = {"query": queries[i], "error": str(e)}
+        
+        # Without render worker processes, renders run on the shared render threads
+        render_executor = batch_render_executor if get_render_service() is None else None
+        await asyncio.gather(
+            *(compose(i, context, ranked) for i, context, ranked in zip(pending, contexts, rankings)),
+            *(reuse(i, hit) for i, hit in cached.items())
+        )
+        return results
     
-    def get_senders(self) -> List[str]:
-        """Return the list of unique senders in the chat"""
-        return self.unique_senders 
\ No newline at end of file
+    def get_senders(self, chat_id: Optional[str] = None) -> List[str]:
+        """Return the list of unique senders in the given (or last ingested) chat"""
+        chat_id = chat_id or self.chat_id
+        if chat_id and chat_id not in self.senders_by_chat:
+            # Chats ingested by another process or before a restart
+            columns = self._stored_messages(chat_id)
+            if columns is not None:
+                self.senders_by_chat[chat_id] = sorted(sender for sender in columns.senders if sender)
+        return self.senders_by_chat.get(chat_id, [])
+    
+    def get_chat_stats(self, chat_id: Optional[str] = None) -> Optional[Dict]:
+        """Message counts of the given (or last ingested) chat from its stored messages, None if there are none"""
+        columns = self._stored_messages(chat_id or self.chat_id)
+        return message_stats(columns) if columns is not None else None
+    
+    def reindex_chat(self, chat_id: str, **chunking) -> int:
+        """
+        Rebuild a chat's index from its stored messages with other grouping or
+        chunking parameters (see local_ingestion.reindex_chat) and return the
+        number of chunks.
+        """
+        chunks = reindex_chat(chat_id, **chunking)
+        self.vector_stores.invalidate(chat_id)
+        if self.meme_cache is not None:
+            self.meme_cache.invalidate_chat(chat_id)
+        return chunks
+    
+    def _stored_messages(self, chat_id: Optional[str]) -> Optional[MessageColumns]:
+        """Memory-mapped messages stored with the chat's index"""
+        try:
+            return load_columns(os.path.join(self.vector_stores.path_for(chat_id), MESSAGES_DIR)) if chat_id else None
+        except ValueError:
+            return None
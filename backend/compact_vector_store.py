@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from typing import Dict, List, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+INDEX_FILE = "index.faiss"
+TEXTS_FILE = "docstore.bin"
+OFFSETS_FILE = "docstore_offsets.npy"
+METADATA_FILE = "docstore_metadata.json"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+STORE_FILES = (INDEX_FILE, TEXTS_FILE, OFFSETS_FILE, METADATA_FILE, LEGACY_DOCSTORE_FILE)
+
+# Loads that catch a save between two of its files are retried this many times
+LOAD_RETRIES = 5
+LOAD_RETRY_DELAY = 0.1
+
+
+class CompactDocstore(Docstore, AddableMixin):
+    """
+    Docstore backed by one UTF-8 blob of all chunk texts, an array of byte
+    offsets into it and a list of metadata dicts, all in index order. Documents
+    are decoded on demand, so a memory-mapped blob costs no heap until read.
+    Documents added after loading are kept in memory until the next save.
+    """
+
+    def __init__(self, texts: Union[bytes, np.ndarray], offsets: np.ndarray, metadatas: List[dict]):
+        self._texts = texts
+        self._offsets = offsets
+        self._metadatas = metadatas
+        self._added: Dict[str, Document] = {}
+
+    def __len__(self) -> int:
+        return len(self._metadatas) + len(self._added)
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._added:
+            return self._added[search]
+        try:
+            position = int(search)
+        except ValueError:
+            return f"ID {search} not found."
+        if not 0 <= position < len(self._metadatas):
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return Document(
+            id=search,
+            page_content=bytes(self._texts[start:end]).decode("utf-8"),
+            metadata=self._metadatas[position]
+        )
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        self._added.update(texts)
+
+
+def _replace_atomically(path: str, write) -> None:
+    """Write to a temporary file and rename it over `path`, so readers that
+    memory-mapped the previous version keep a consistent view of it"""
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_compact(vector_store: FAISS, path: str) -> None:
+    """Save a FAISS vector store as a raw index plus a compact docstore"""
+    os.makedirs(path, exist_ok=True)
+    documents = [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+        for position in range(vector_store.index.ntotal)
+    ]
+    encoded = [doc.page_content.encode("utf-8") for doc in documents]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+
+    def write_texts(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            for text in encoded:
+                f.write(text)
+
+    def write_offsets(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, offsets)
+
+    def write_metadata(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([doc.metadata for doc in documents], f, ensure_ascii=False)
+
+    # The files are replaced one by one, so load_compact checks that they match.
+    # The index goes last: it marks the chat as ingested, and the documents it
+    # refers to are then already saved.
+    _replace_atomically(os.path.join(path, TEXTS_FILE), write_texts)
+    _replace_atomically(os.path.join(path, OFFSETS_FILE), write_offsets)
+    _replace_atomically(os.path.join(path, METADATA_FILE), write_metadata)
+    _replace_atomically(os.path.join(path, INDEX_FILE), lambda tmp_path: faiss.write_index(vector_store.index, tmp_path))
+
+    legacy_path = os.path.join(path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def _read_compact(path: str, mmap: bool):
+    """The index, texts, offsets and metadata of a store saved by save_compact"""
+    index_path = os.path.join(path, INDEX_FILE)
+    texts_path = os.path.join(path, TEXTS_FILE)
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(index_path, flags)
+        texts = np.memmap(texts_path, dtype=np.uint8, mode='r') if os.path.getsize(texts_path) else b""
+        offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode='r')
+    else:
+        index = faiss.read_index(index_path)
+        with open(texts_path, 'rb') as f:
+            texts = f.read()
+        offsets = np.load(os.path.join(path, OFFSETS_FILE))
+    with open(os.path.join(path, METADATA_FILE), 'r', encoding='utf-8') as f:
+        metadatas = json.load(f)
+    return index, texts, offsets, metadatas
+
+
+def load_compact(path: str, embeddings: Embeddings, mmap: bool = True) -> FAISS:
+    """
+    Load a vector store saved by save_compact, falling back to LangChain's
+    pickled format for stores saved before it existed.
+
+    With `mmap`, the index vectors and document texts are memory-mapped
+    instead of read into memory. A memory-mapped index is read-only: load
+    with `mmap=False` to add to it.
+
+    A load that reads files of two different saves, e.g. during an ingestion,
+    is retried; if they still don't match, a RuntimeError is raised.
+    """
+    if not os.path.exists(os.path.join(path, TEXTS_FILE)):
+        return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+    for attempt in range(LOAD_RETRIES + 1):
+        index, texts, offsets, metadatas = _read_compact(path, mmap)
+        if index.ntotal == len(metadatas) == len(offsets) - 1 and int(offsets[-1]) == len(texts):
+            break
+        if attempt == LOAD_RETRIES:
+            raise RuntimeError(
+                f"Vector store at {path} is inconsistent: {index.ntotal} vectors, "
+                f"{len(metadatas)} documents, {len(offsets) - 1} offsets"
+            )
+        time.sleep(LOAD_RETRY_DELAY)
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=CompactDocstore(texts, offsets, metadatas),
+        index_to_docstore_id={position: str(position) for position in range(index.ntotal)}
+    )
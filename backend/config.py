@@ -19,11 +19,79 @@ class Config:
     # Vector Store Settings
     VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "backend/vector_store")
     VECTOR_STORE_TOP_K = int(os.getenv("VECTOR_STORE_TOP_K", "5"))
+    # Byte budget for per-chat indexes kept loaded in memory
+    VECTOR_STORE_CACHE_MAX_BYTES = int(os.getenv("VECTOR_STORE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    # Append only new messages of a re-uploaded chat instead of rebuilding the index
+    INGEST_INCREMENTAL = os.getenv("INGEST_INCREMENTAL", "true").lower() == "true"
+    # Ingest uploads as background jobs polled through /api/ingest-status/<job_id>
+    INGEST_ASYNC = os.getenv("INGEST_ASYNC", "true").lower() == "true"
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+    INGEST_JOB_BACKEND = os.getenv("INGEST_JOB_BACKEND", "memory")  # memory or sqlite
+    INGEST_JOBS_DB = os.getenv("INGEST_JOBS_DB", "backend/ingest_jobs.sqlite3")
+    INGEST_JOB_TTL = float(os.getenv("INGEST_JOB_TTL", str(24 * 60 * 60)))  # seconds finished jobs are kept
+    INGEST_UPLOAD_PATH = os.getenv("INGEST_UPLOAD_PATH", "backend/uploads")
+    # Conversation chunks pack whole messages up to CHUNK_SIZE, repeating up to
+    # CHUNK_OVERLAP of the previous chunk's last messages, measured in CHUNK_UNIT
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "2000"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+    CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")  # chars or tokens (of EMBEDDING_MODEL)
+    
+    # Embedding Cache Settings
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "backend/embedding_cache")
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    
+    # Embedding Pipeline Settings
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "4"))
+    EMBEDDING_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", "10"))
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
     
     # Meme Generation Settings
     MEME_TEMPLATE_PATH = os.getenv("MEME_TEMPLATE_PATH", "utils/9au02y.jpg")
     MEME_OUTPUT_PATH = os.getenv("MEME_OUTPUT_PATH", "output_meme.jpg")
+    MEME_OUTPUT_FORMAT = os.getenv("MEME_OUTPUT_FORMAT", "JPEG")  # JPEG, WEBP or PNG
+    MEME_OUTPUT_QUALITY = int(os.getenv("MEME_OUTPUT_QUALITY", "95"))
+    MEME_OUTPUT_PROGRESSIVE = os.getenv("MEME_OUTPUT_PROGRESSIVE", "false").lower() == "true"
     MEME_FONT_PATH = os.getenv("MEME_FONT_PATH", "utils/fonts/Arial_Unicode.ttf")
+    # Byte budget for decoded RGB templates kept in memory between renders
+    MEME_TEMPLATE_CACHE_MAX_BYTES = int(os.getenv("MEME_TEMPLATE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    # Composite cached, pre-rendered caption layers instead of drawing captions on each render
+    MEME_TEXT_LAYERS = os.getenv("MEME_TEXT_LAYERS", "false").lower() == "true"
+    # "fused" picks the template and writes the text in one LLM call,
+    # "two_step" makes separate template selection and text generation calls
+    MEME_GENERATION_MODE = os.getenv("MEME_GENERATION_MODE", "fused")
+    # Worker processes rendering memes off the request thread (0 renders in-process)
+    RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+    # Most recently used template images decoded by each render worker at startup
+    RENDER_PRELOAD_TEMPLATES = int(os.getenv("RENDER_PRELOAD_TEMPLATES", "20"))
+    
+    # Meme Cache Settings
+    MEME_CACHE_ENABLED = os.getenv("MEME_CACHE_ENABLED", "true").lower() == "true"
+    MEME_CACHE_BACKEND = os.getenv("MEME_CACHE_BACKEND", "memory")  # memory or local
+    MEME_CACHE_PATH = os.getenv("MEME_CACHE_PATH", "backend/meme_cache")
+    MEME_CACHE_TTL = float(os.getenv("MEME_CACHE_TTL", str(24 * 60 * 60)))  # seconds
+    MEME_CACHE_MAX_ENTRIES = int(os.getenv("MEME_CACHE_MAX_ENTRIES", "500"))
+    # Minimum cosine similarity for a differently worded query of the same chat to hit (0 disables)
+    MEME_CACHE_SIMILARITY = float(os.getenv("MEME_CACHE_SIMILARITY", "0.92"))
+    # On a hit, "none" returns the cached meme and "text" regenerates its text on the cached template
+    MEME_CACHE_VARIETY = os.getenv("MEME_CACHE_VARIETY", "none")
+    
+    # Batch Generation Settings
+    BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+    BATCH_RENDER_WORKERS = int(os.getenv("BATCH_RENDER_WORKERS", str(os.cpu_count() or 2)))
+    
+    # Template Cache Settings
+    TEMPLATE_CACHE_PATH = os.getenv("TEMPLATE_CACHE_PATH", "backend/template_cache")
+    TEMPLATE_CATALOG_TTL = float(os.getenv("TEMPLATE_CATALOG_TTL", str(24 * 60 * 60)))  # seconds
+    TEMPLATE_IMAGE_CACHE_MAX_BYTES = int(os.getenv("TEMPLATE_IMAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+    TEMPLATE_WARMUP_COUNT = int(os.getenv("TEMPLATE_WARMUP_COUNT", "100"))
+    # Templates pre-ranked by embedding similarity and offered to the LLM
+    TEMPLATE_CANDIDATES = int(os.getenv("TEMPLATE_CANDIDATES", "10"))
+    # Pick the top-ranked template without the LLM when its similarity is at least
+    # this score and leads the runner-up by the margin (0 disables auto-selection)
+    TEMPLATE_AUTO_SELECT_SCORE = float(os.getenv("TEMPLATE_AUTO_SELECT_SCORE", "0"))
+    TEMPLATE_AUTO_SELECT_MARGIN = float(os.getenv("TEMPLATE_AUTO_SELECT_MARGIN", "0.05"))
     
     # Text Settings
     MEME_TEXT_MAX_WIDTH_RATIO = float(os.getenv("MEME_TEXT_MAX_WIDTH_RATIO", "0.9"))
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking across processes
+    fcntl = None
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import Config
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of embedding vectors.
+
+    Vectors are keyed by (model, sha256(text)). Each model gets a float32
+    matrix file that is memory-mapped for reads and appended to for writes,
+    plus a JSON index mapping text hashes to matrix rows. When the matrices
+    outgrow ``max_bytes``, the least recently used rows are evicted and the
+    files are compacted.
+
+    Processes sharing ``cache_dir`` serialize their writes with a lock file
+    per model, and reload the index whenever another process has replaced
+    it. Within a process, use get_shared_embedding_cache.
+    """
+
+    def __init__(self, cache_dir: str = Config.EMBEDDING_CACHE_PATH, max_bytes: int = Config.EMBEDDING_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._models: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        """Content address of a text"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _paths(self, model: str):
+        safe_model = "".join(c if c.isalnum() or c in "-_." else "_" for c in model)
+        base = os.path.join(self.cache_dir, safe_model)
+        return base + ".f32", base + ".json", base + ".lock"
+
+    @contextmanager
+    def _file_lock(self, model: str, exclusive: bool) -> Iterator[None]:
+        """Lock a model's files against other processes sharing the cache directory"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._paths(model)[2], 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int, int]]:
+        """Identity of a file version; the index is replaced, never modified in place"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load_model(self, model: str) -> dict:
+        """Load the index of a model's cache, again whenever it changed on disk"""
+        matrix_path, index_path, _ = self._paths(model)
+        state = self._models.setdefault(
+            model, {"dim": None, "rows": {}, "tick": 0, "matrix": None, "signature": None}
+        )
+        signature = self._signature(index_path)
+        if state["signature"] != signature or (signature is None and state["rows"]):
+            state.update(dim=None, rows={}, tick=0)
+            if signature is not None and os.path.exists(matrix_path):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                state.update(dim=index["dim"], rows=index["rows"], tick=index["tick"])
+            # Rows may have been compacted into a new matrix file
+            state.update(matrix=None, signature=signature)
+        return state
+
+    def _matrix(self, model: str, state: dict) -> Optional[np.memmap]:
+        """Memory-map the model's matrix, remapping after it has grown"""
+        matrix_path = self._paths(model)[0]
+        if state["dim"] is None or not os.path.exists(matrix_path):
+            return None
+        n_rows = os.path.getsize(matrix_path) // (4 * state["dim"])
+        if state["matrix"] is None or state["matrix"].shape[0] != n_rows:
+            state["matrix"] = np.memmap(matrix_path, dtype=np.float32, mode='r', shape=(n_rows, state["dim"]))
+        return state["matrix"]
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up cached vectors, returning None for texts that are not cached"""
+        with self._lock, self._file_lock(model, exclusive=False):
+            state = self._load_model(model)
+            matrix = self._matrix(model, state)
+            results = []
+            for text in texts:
+                entry = state["rows"].get(self.text_key(text))
+                if entry is None or matrix is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                state["tick"] += 1
+                entry[1] = state["tick"]
+                results.append(matrix[entry[0]].tolist())
+            return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        """Append vectors to the model's matrix and persist the index"""
+        if not texts:
+            return
+        with self._lock, self._file_lock(model, exclusive=True):
+            state = self._load_model(model)
+            block = np.asarray(vectors, dtype=np.float32)
+            if state["dim"] is None:
+                state["dim"] = block.shape[1]
+            row_bytes = 4 * state["dim"]
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._paths(model)[0], 'ab') as f:
+                # Rows are numbered from where they are actually written
+                offset = f.seek(0, os.SEEK_END)
+                if offset % row_bytes:
+                    # Drop a partial row left by an interrupted write
+                    offset -= offset % row_bytes
+                    f.truncate(offset)
+                f.write(block.tobytes())
+            n_rows = offset // row_bytes
+            for i, text in enumerate(texts):
+                state["tick"] += 1
+                state["rows"][self.text_key(text)] = [n_rows + i, state["tick"]]
+            if (n_rows + len(texts)) * 4 * state["dim"] > self.max_bytes:
+                self._evict(model, state)
+            self._save_index(model, state)
+
+    def _evict(self, model: str, state: dict) -> None:
+        """Keep the most recently used rows that fit in half the byte budget and compact"""
+        row_bytes = 4 * state["dim"]
+        keep = max(int(self.max_bytes // 2 // row_bytes), 0)
+        survivors = sorted(state["rows"].items(), key=lambda item: item[1][1], reverse=True)[:keep]
+        survivors.sort(key=lambda item: item[1][0])
+        matrix = self._matrix(model, state)
+        compacted = np.ascontiguousarray(matrix[[entry[0] for _, entry in survivors]])
+        state["matrix"] = None
+        del matrix
+
+        matrix_path = self._paths(model)[0]
+        tmp_path = matrix_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compacted.tobytes())
+        os.replace(tmp_path, matrix_path)
+        state["rows"] = {key: [row, entry[1]] for row, (key, entry) in enumerate(survivors)}
+
+    def _save_index(self, model: str, state: dict) -> None:
+        index_path = self._paths(model)[1]
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"dim": state["dim"], "tick": state["tick"], "rows": state["rows"]}, f)
+        os.replace(tmp_path, index_path)
+        state["signature"] = self._signature(index_path)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters since this cache was created"""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache, so every CachedEmbeddings shares one index and lock"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document embeddings from an EmbeddingCache
+    and only calls the underlying model for texts it has never embedded.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: Optional[EmbeddingCache] = None, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.cache = cache or get_shared_embedding_cache()
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        # Counters of this wrapper only; the shared cache counts every wrapper in the process
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached vectors of the texts, None for texts that are not cached"""
+        vectors = self.cache.get_many(self.model, texts)
+        hits = sum(vector is not None for vector in vectors)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return vectors
+
+    def store(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """Cache vectors computed for the texts"""
+        self.cache.put_many(self.model, texts, vectors)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of the lookups through this wrapper"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.lookup(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.store(missing, [computed[text] for text in missing])
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from config import Config
+from embedding_cache import CachedEmbeddings
+
+
+def process_in_batches(texts: List[str], batch_size: int = 100):
+    """Process texts in batches to avoid rate limits."""
+    for i in range(0, len(texts), batch_size):
+        yield texts[i:i + batch_size]
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` are available, then consume them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _embed_batch_with_retry(
+    embeddings: Embeddings, batch: List[str], bucket: TokenBucket,
+    max_retries: int, backoff: float
+) -> List[List[float]]:
+    """Embed one batch, retrying with exponential backoff and jitter on failure"""
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            return embeddings.embed_documents(batch)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            print(f"Embedding batch failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_texts(
+    embeddings: Embeddings,
+    texts: List[str],
+    batch_size: int = Config.EMBEDDING_BATCH_SIZE,
+    max_workers: int = Config.EMBEDDING_MAX_WORKERS,
+    requests_per_second: float = Config.EMBEDDING_REQUESTS_PER_SECOND,
+    max_retries: int = Config.EMBEDDING_MAX_RETRIES,
+    backoff: float = 1.0,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> List[List[float]]:
+    """
+    Embed texts concurrently in batches on a bounded thread pool.
+
+    Every embedding request passes through a shared token bucket, failed
+    batches are retried with backoff, and the vectors are returned in the
+    same order as `texts` regardless of which batch finishes first.
+    `progress(done, total)` is called with the number of texts embedded so
+    far each time a batch completes.
+    """
+    if not texts:
+        return []
+    bucket = TokenBucket(requests_per_second)
+    batches = list(process_in_batches(texts, batch_size))
+    done = 0
+    done_lock = threading.Lock()
+
+    def embed_batch(batch: List[str]) -> List[List[float]]:
+        nonlocal done
+        vectors = _embed_batch_with_retry(embeddings, batch, bucket, max_retries, backoff)
+        if progress is not None:
+            with done_lock:
+                done += len(batch)
+                progress(done, len(texts))
+        return vectors
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = [executor.submit(embed_batch, batch) for batch in batches]
+        # Reassemble in submission order
+        vectors = []
+        for future in futures:
+            vectors.extend(future.result())
+    return vectors
+
+
+def embed_texts_cached(
+    embeddings: CachedEmbeddings,
+    texts: List[str],
+    progress: Optional[Callable[[int, int], None]] = None,
+    **kwargs
+) -> List[List[float]]:
+    """
+    embed_texts through an embedding cache: cached texts are served without
+    waiting on the rate limiter, and only the texts never embedded before are
+    sent to the underlying model, then cached. `progress(done, total)` counts
+    the cached texts as done from the start.
+    """
+    vectors = embeddings.lookup(texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    cached = len(texts) - len(missing)
+    if progress is not None:
+        progress(cached, len(texts))
+    if not missing:
+        return vectors
+    computed = embed_texts(
+        embeddings.embeddings, missing,
+        progress=None if progress is None else lambda done, total: progress(cached + done, len(texts)),
+        **kwargs
+    )
+    embeddings.store(missing, computed)
+    computed = dict(zip(missing, computed))
+    return [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
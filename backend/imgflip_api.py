@@ -1,45 +1,218 @@
 import requests
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import os
+import threading
+import time
+
+from config import Config
+
+# Seconds before an unreachable Imgflip API is tried again while a stale catalog is served
+CATALOG_RETRY_INTERVAL = 300
+
+def template_digest(templates: List[Dict]) -> str:
+    """Serialize templates compactly (id, name and box_count only) for LLM prompts"""
+    digest = [{"id": t["id"], "name": t["name"], "box_count": t["box_count"]} for t in templates]
+    return json.dumps(digest, ensure_ascii=False, separators=(",", ":"))
 
 class ImgflipAPI:
     """Handler for Imgflip API interactions"""
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        cache_dir: str = Config.TEMPLATE_CACHE_PATH,
+        catalog_ttl: float = Config.TEMPLATE_CATALOG_TTL,
+        max_image_bytes: int = Config.TEMPLATE_IMAGE_CACHE_MAX_BYTES
+    ):
         self.base_url = "https://api.imgflip.com"
         self._meme_templates = None
-    
+        self._catalog_fetched_at = 0.0  # When the in-memory catalog was fetched from the API
+        # On-disk template store: catalog.json plus content-addressed images
+        # under images/, indexed by URL in images.json
+        self.cache_dir = cache_dir
+        self.catalog_ttl = catalog_ttl
+        self.max_image_bytes = max_image_bytes
+        self._catalog_path = os.path.join(cache_dir, "catalog.json")
+        self._images_dir = os.path.join(cache_dir, "images")
+        self._image_index_path = os.path.join(cache_dir, "images.json")
+        self._image_index = None
+        self._lock = threading.Lock()
+        self._digest = None  # (catalog, box_count, serialized digest)
+
+    def _read_catalog(self) -> Optional[Dict]:
+        if not os.path.exists(self._catalog_path):
+            return None
+        with open(self._catalog_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_json(self, path: str, data) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
     def get_meme_templates(self, force_refresh: bool = False) -> List[Dict]:
         """
         Get a list of available meme templates from Imgflip API.
-        Caches the results to avoid unnecessary API calls.
+        Caches the results in memory and in a catalog file on disk, both
+        reused until they are older than the catalog TTL. A stale catalog is
+        still served if the API can't be reached, retrying the API every
+        CATALOG_RETRY_INTERVAL seconds.
         """
-        if self._meme_templates is None or force_refresh:
-            response = requests.get(f"{self.base_url}/get_memes")
+        now = time.time()
+        if self._meme_templates is not None and not force_refresh and now - self._catalog_fetched_at < self.catalog_ttl:
+            return self._meme_templates
+
+        catalog = self._read_catalog()
+        if catalog and not force_refresh and now - catalog["fetched_at"] < self.catalog_ttl:
+            self._meme_templates = catalog["memes"]
+            self._catalog_fetched_at = catalog["fetched_at"]
+            return self._meme_templates
+
+        try:
+            response = requests.get(f"{self.base_url}/get_memes", timeout=10)
             response.raise_for_status()
             data = response.json()
-            
-            if data["success"]:
-                self._meme_templates = data["data"]["memes"]
-            else:
-                raise Exception(f"Failed to get meme templates: {data.get('error_message')}")
-        
+        except requests.RequestException as e:
+            stale = catalog["memes"] if catalog else self._meme_templates
+            if stale is not None:
+                print(f"Warning: using stale template catalog, Imgflip unreachable: {e}")
+                self._meme_templates = stale
+                self._catalog_fetched_at = now - self.catalog_ttl + CATALOG_RETRY_INTERVAL
+                return self._meme_templates
+            raise
+
+        if data["success"]:
+            self._meme_templates = data["data"]["memes"]
+            self._catalog_fetched_at = now
+            self._write_json(self._catalog_path, {"fetched_at": now, "memes": self._meme_templates})
+        else:
+            raise Exception(f"Failed to get meme templates: {data.get('error_message')}")
+
         return self._meme_templates
-    
+
+    def get_two_box_templates(self, box_count: int = 2, templates: Optional[List[Dict]] = None) -> List[Dict]:
+        """Templates (of the current catalog by default) with exactly box_count text boxes, top and bottom text by default"""
+        if templates is None:
+            templates = self.get_meme_templates()
+        return [t for t in templates if t.get("box_count") == box_count]
+
+    def get_template_digest(self, box_count: int = 2) -> str:
+        """
+        Compact JSON digest of the usable templates (id, name and box_count only),
+        pre-serialized once per catalog so LLM prompts don't carry URLs and dimensions.
+        """
+        templates = self.get_meme_templates()
+        # The catalog itself is kept, so a refreshed list can't reuse the id of a freed one
+        digest = self._digest
+        if digest is None or digest[0] is not templates or digest[1] != box_count:
+            digest = (templates, box_count, template_digest(self.get_two_box_templates(box_count, templates)))
+            self._digest = digest
+        return digest[2]
+
+    def _load_image_index(self) -> Dict:
+        """URL -> {"file": content-addressed file name, "size": bytes, "used": last use time}"""
+        if self._image_index is None:
+            if os.path.exists(self._image_index_path):
+                with open(self._image_index_path, "r", encoding="utf-8") as f:
+                    self._image_index = json.load(f)
+            else:
+                self._image_index = {}
+        return self._image_index
+
+    def get_template_image(self, template_url: str) -> str:
+        """
+        Return the local path of a template image, downloading it only the
+        first time it is used. Images are stored by the sha256 of their content.
+        """
+        with self._lock:
+            index = self._load_image_index()
+            entry = index.get(template_url)
+            if entry and os.path.exists(os.path.join(self._images_dir, entry["file"])):
+                # Recency is persisted with the next index write
+                entry["used"] = time.time()
+                return os.path.join(self._images_dir, entry["file"])
+
+        response = requests.get(template_url, timeout=30)
+        response.raise_for_status()
+        content = response.content
+        _, ext = os.path.splitext(template_url.split("?")[0])
+        file_name = hashlib.sha256(content).hexdigest() + (ext or ".jpg")
+        image_path = os.path.join(self._images_dir, file_name)
+
+        with self._lock:
+            os.makedirs(self._images_dir, exist_ok=True)
+            if not os.path.exists(image_path):
+                tmp_path = image_path + f".{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, image_path)
+            index = self._load_image_index()
+            index[template_url] = {"file": file_name, "size": len(content), "used": time.time()}
+            self._evict_images(keep=template_url)
+            self._write_json(self._image_index_path, index)
+        return image_path
+
+    def cached_image_paths(self, limit: Optional[int] = None) -> List[str]:
+        """Local paths of cached template images, most recently used first"""
+        with self._lock:
+            entries = sorted(self._load_image_index().values(), key=lambda entry: entry["used"], reverse=True)
+        paths = [os.path.join(self._images_dir, entry["file"]) for entry in entries]
+        return list(dict.fromkeys(path for path in paths if os.path.exists(path)))[:limit]
+
+    def _evict_images(self, keep: str) -> None:
+        """Drop least recently used images until the cache fits its byte budget"""
+        index = self._image_index
+        total = sum(entry["size"] for entry in index.values())
+        for url, entry in sorted(index.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_image_bytes:
+                break
+            if url == keep:
+                continue
+            del index[url]
+            total -= entry["size"]
+            # Identical images share a file, only remove it once unreferenced
+            if not any(other["file"] == entry["file"] for other in index.values()):
+                image_path = os.path.join(self._images_dir, entry["file"])
+                if os.path.exists(image_path):
+                    os.remove(image_path)
+
+    def warm_up(self, limit: int = Config.TEMPLATE_WARMUP_COUNT, max_workers: int = 8) -> int:
+        """
+        Pre-fetch the catalog and the images of the `limit` most popular
+        templates. Returns the number of images available locally.
+        """
+        try:
+            templates = self.get_meme_templates()[:limit]
+        except Exception as e:
+            print(f"Warning: could not warm up template cache: {e}")
+            return 0
+
+        def fetch(template):
+            try:
+                self.get_template_image(template["url"])
+                return True
+            except Exception as e:
+                print(f"Warning: could not pre-fetch template {template.get('name')}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return sum(executor.map(fetch, templates))
+
     def download_template(self, template_url: str, output_path: str) -> str:
         """
-        Download a meme template image and save it to the specified path.
+        Save a meme template image to the specified path, from the local
+        cache when available.
         Returns the path to the downloaded image.
         """
-        response = requests.get(template_url, stream=True)
-        response.raise_for_status()
-        
-        with open(output_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
+        with open(self.get_template_image(template_url), "rb") as src, open(output_path, "wb") as f:
+            f.write(src.read())
+
         return output_path
-    
+
 
 
 if __name__ == "__main__":
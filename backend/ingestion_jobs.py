@@ -0,0 +1,174 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from config import Config
+
+
+class JobStore:
+    """Storage backend of ingestion jobs; a job is a JSON-serializable dict keyed by its ID"""
+
+    def create(self, job: dict) -> None:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def prune(self, older_than: float) -> None:
+        """Drop finished jobs last updated before the `older_than` timestamp"""
+        raise NotImplementedError
+
+
+class InMemoryJobStore(JobStore):
+    """Jobs kept in process memory, visible to this process only"""
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def prune(self, older_than: float) -> None:
+        with self._lock:
+            for job_id in [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in ("done", "failed") and job["updated_at"] < older_than
+            ]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs in a SQLite file, visible to every process sharing it and kept across restarts"""
+
+    def __init__(self, path: str = Config.INGEST_JOBS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at REAL NOT NULL, state TEXT NOT NULL)"
+        )
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            connection = sqlite3.connect(self.path, timeout=30)
+            try:
+                with connection:
+                    return connection.execute(sql, params).fetchall()
+            finally:
+                connection.close()
+
+    def _write(self, job: dict) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO jobs (id, status, updated_at, state) VALUES (?, ?, ?, ?)",
+            (job["id"], job["status"], job["updated_at"], json.dumps(job, ensure_ascii=False))
+        )
+
+    def create(self, job: dict) -> None:
+        self._write(job)
+
+    def update(self, job_id: str, **fields) -> None:
+        job = self.get(job_id)
+        if job is not None:
+            job.update(fields, updated_at=time.time())
+            self._write(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        rows = self._execute("SELECT state FROM jobs WHERE id = ?", (job_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def prune(self, older_than: float) -> None:
+        self._execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (older_than,)
+        )
+
+
+def create_job_store() -> JobStore:
+    """Job store on the backend selected by INGEST_JOB_BACKEND ("memory" or "sqlite")"""
+    if Config.INGEST_JOB_BACKEND == "sqlite":
+        return SQLiteJobStore()
+    if Config.INGEST_JOB_BACKEND == "memory":
+        return InMemoryJobStore()
+    raise ValueError(f"Unknown ingestion job backend: {Config.INGEST_JOB_BACKEND!r}")
+
+
+class IngestionQueue:
+    """
+    Runs chat ingestions in the background on worker threads of this process,
+    recording each job's status and stage-level progress in a JobStore.
+
+    A job moves through the stages reported by ingest_chat: queued, parsed,
+    chunked, embedding (with embedded/total counts) and indexed. Its status is
+    queued, running, done (with chat_id and senders) or failed (with error).
+    """
+
+    def __init__(self, handler, store: Optional[JobStore] = None, workers: int = Config.INGEST_WORKERS, job_ttl: float = Config.INGEST_JOB_TTL):
+        self.handler = handler  # ChatFlowHandler the chats are ingested into
+        self.store = store or InMemoryJobStore()
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+
+    def submit(self, chat_path: str, incremental: bool = Config.INGEST_INCREMENTAL, cleanup: bool = True) -> str:
+        """Queue the ingestion of a chat file and return the job ID; with cleanup, the file is removed afterwards"""
+        self.store.prune(time.time() - self.job_ttl)
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self.store.create({
+            "id": job_id,
+            "status": "queued",
+            "stage": "queued",
+            "progress": {},
+            "chat_id": None,
+            "senders": [],
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        self._executor.submit(self._run, job_id, chat_path, incremental, cleanup)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def _run(self, job_id: str, chat_path: str, incremental: bool, cleanup: bool) -> None:
+        self.store.update(job_id, status="running")
+
+        def progress(stage: str, details: Dict) -> None:
+            self.store.update(job_id, stage=stage, progress=details)
+
+        try:
+            chat_id = self.handler.ingest_uploaded_chat(chat_path, incremental=incremental, progress=progress)
+            if chat_id is None:
+                self.store.update(job_id, status="failed", error="No messages found in the chat")
+            else:
+                self.store.update(job_id, status="done", chat_id=chat_id, senders=self.handler.get_senders(chat_id))
+        except Exception as e:
+            print(f"Error processing chat: {str(e)}")
+            self.store.update(job_id, status="failed", error=str(e))
+        finally:
+            if cleanup and os.path.exists(chat_path):
+                os.remove(chat_path)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -1,186 +1,394 @@
-from whatsapp_handler import WhatsAppMessageHandler
+from whatsapp_handler import ChatSource, WhatsAppMessageHandler, WhatsAppMessage, parse_iso_timestamp
 from dotenv import load_dotenv
 load_dotenv()
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from compact_vector_store import INDEX_FILE, load_compact, save_compact
+from config import Config
+from embedding_cache import CachedEmbeddings
+from embedding_pipeline import embed_texts_cached
+from message_columns import MESSAGES_DIR, MessageColumns, chunk_ranges, conversation_ranges, from_epoch, load_columns, save_columns, to_epoch
+import hashlib
+import json
+import numpy as np
 import os
 import time
-from typing import List
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
 
-def process_in_batches(texts: List[str], batch_size: int = 100):
-    """Process texts in batches to avoid rate limits."""
-    for i in range(0, len(texts), batch_size):
-        yield texts[i:i + batch_size]
-
-def extract_timestamp(message: str) -> datetime:
-    """Extract timestamp from a message in format [YYYY-MM-DD HH:MM:SS]."""
-    try:
-        # Extract timestamp between first [ and ]
-        timestamp_str = message[message.find("[")+1:message.find("]")]
-        return datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-    except (ValueError, IndexError):
-        return None
-
-def group_messages_by_conversation(messages: List[str], min_messages: int = 10, max_time_gap: int = 30) -> List[List[str]]:
+def group_messages_by_conversation(messages: Iterable[WhatsAppMessage], min_messages: int = 10, max_time_gap: int = 30) -> List[List[WhatsAppMessage]]:
     """
     Group messages into conversations based on time gaps and minimum message count.
+    See conversation_ranges, which this wraps for callers holding message objects.
     
     Args:
-        messages (List[str]): List of messages to group
+        messages (Iterable[WhatsAppMessage]): Messages to group
         min_messages (int): Minimum number of messages per conversation
         max_time_gap (int): Maximum time gap in minutes between messages
         
     Returns:
-        List[List[str]]: List of conversation groups
+        List[List[WhatsAppMessage]]: List of conversation groups
     """
-    if not messages:
-        return []
+    messages = list(messages)
+    timestamps = np.fromiter((to_epoch(message.timestamp) for message in messages), dtype=np.int64, count=len(messages))
+    return [
+        messages[start:end]
+        for start, end in conversation_ranges(timestamps, min_messages, max_time_gap).tolist()
+    ]
+
+MANIFEST_FILE = "manifest.json"
+
+def content_hash(text: str) -> str:
+    """Stable content hash used to recognize already-ingested messages and chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def load_manifest(store_path: str) -> Dict:
+    """Load the ingestion manifest stored next to a FAISS index.
     
-    conversations = []
-    current_conversation = []
-    last_timestamp = None
+    The manifest maps a chat key to the state of its last ingestion:
+    ``last_timestamp``, ``boundary_hashes`` (hashes of the messages sent at
+    ``last_timestamp``) and ``chunk_hashes`` (hashes of every indexed chunk).
     
-    for i, message in enumerate(messages):
-        current_timestamp = extract_timestamp(message)
+    Args:
+        store_path (str): Directory of the FAISS index
         
-        if current_timestamp is None:
-            # If we can't parse timestamp, just add to current conversation
-            current_conversation.append(message)
-            continue
-            
-        if last_timestamp is None:
-            current_conversation.append(message)
-        else:
-            time_diff = (current_timestamp - last_timestamp).total_seconds() / 60
-            
-            # Check if we should start a new conversation
-            if time_diff > max_time_gap and len(current_conversation) >= min_messages:
-                conversations.append(current_conversation)
-                current_conversation = []
-            
-            current_conversation.append(message)
+    Returns:
+        Dict: The manifest, with an empty ``chats`` mapping if none exists yet
+    """
+    manifest_path = os.path.join(store_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {"chats": {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(store_path: str, manifest: Dict) -> None:
+    """Write the ingestion manifest next to a FAISS index."""
+    os.makedirs(store_path, exist_ok=True)
+    with open(os.path.join(store_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+def skip_ingested_messages(messages: Iterable[WhatsAppMessage], last_timestamp: datetime, boundary_hashes: Set[str]) -> Iterator[WhatsAppMessage]:
+    """Drop messages that a previous ingestion already covered.
+    
+    Args:
+        messages (Iterable[WhatsAppMessage]): Messages of the full export, in order
+        last_timestamp (datetime): Timestamp of the newest previously ingested message
+        boundary_hashes (Set[str]): Hashes of the messages ingested at ``last_timestamp``
         
-        last_timestamp = current_timestamp if current_timestamp else last_timestamp
+    Yields:
+        WhatsAppMessage: Only messages newer than the previous ingestion
+    """
+    for message in messages:
+        if message.timestamp < last_timestamp:
+            continue
+        if message.timestamp == last_timestamp and content_hash(str(message)) in boundary_hashes:
+            continue
+        yield message
+
+def collect_senders(messages: Iterable[WhatsAppMessage], senders: Set[str]) -> Iterator[WhatsAppMessage]:
+    """Pass messages through unchanged while recording their senders.
+    
+    Lets sender extraction piggyback on another single-pass consumer
+    (e.g. conversation grouping) instead of materializing the messages.
+    
+    Args:
+        messages (Iterable[WhatsAppMessage]): Messages to pass through
+        senders (Set[str]): Set that sender names are added to
         
-        # Check if we're at the end of messages
-        if i == len(messages) - 1:
-            if len(current_conversation) >= min_messages:
-                conversations.append(current_conversation)
-            elif conversations:
-                # If the last conversation is too small, add it to the previous one
-                conversations[-1].extend(current_conversation)
-    
-    # Post-process conversations to ensure minimum message count
-    processed_conversations = []
-    temp_conversation = []
-    
-    for conv in conversations:
-        temp_conversation.extend(conv)
-        if len(temp_conversation) >= min_messages:
-            processed_conversations.append(temp_conversation)
-            temp_conversation = []
-    
-    # Handle any remaining messages
-    if temp_conversation:
-        if processed_conversations:
-            processed_conversations[-1].extend(temp_conversation)
-        elif len(temp_conversation) >= min_messages:
-            processed_conversations.append(temp_conversation)
-    
-    return processed_conversations
-
-def extract_unique_senders(messages: List[str]) -> List[str]:
+    Yields:
+        WhatsAppMessage: The input messages, in order
+    """
+    for message in messages:
+        if message.sender:  # Only add non-empty sender names
+            senders.add(message.sender)
+        yield message
+
+def extract_unique_senders(messages: Iterable[WhatsAppMessage]) -> List[str]:
     """Extract unique sender names from messages.
     
     Args:
-        messages (List[str]): List of messages in string format
+        messages (Iterable[WhatsAppMessage]): Parsed chat messages
         
     Returns:
         List[str]: List of unique sender names
     """
     senders = set()
-    for message in messages:
-        try:
-            # Extract sender name between ] and :
-            parts = message.split(']', 1)
-            if len(parts) > 1:
-                sender = parts[1].split(':', 1)[0].strip()
-                if sender:  # Only add non-empty sender names
-                    senders.add(sender)
-        except (IndexError, AttributeError):
-            continue
-    return sorted(list(senders))
+    for _ in collect_senders(messages, senders):
+        pass
+    return sorted(senders)
 
-def main():
+def chunk_length_function(unit: str = Config.CHUNK_UNIT) -> Optional[Callable[[str], int]]:
+    """Length function of the chunk budget: None for characters, or a token counter of the embedding model"""
+    if unit == "chars":
+        return None
+    if unit == "tokens":
+        import tiktoken
+        encoding = tiktoken.encoding_for_model(Config.EMBEDDING_MODEL)
+        return lambda text: len(encoding.encode_ordinary(text))
+    raise ValueError(f"Unknown chunk unit: {unit!r}")
+
+def build_conversation_chunks(
+    columns: MessageColumns,
+    conversations: np.ndarray,
+    chunk_size: int = Config.CHUNK_SIZE,
+    chunk_overlap: int = Config.CHUNK_OVERLAP,
+    length_function: Optional[Callable[[str], int]] = None
+) -> List[Tuple[str, Dict]]:
+    """Pack each conversation's whole messages into text chunks with their metadata.
+    
+    Args:
+        columns (MessageColumns): Parsed messages of the chat
+        conversations (np.ndarray): [start, end) message ranges of the conversations
+        chunk_size (int): Maximum chunk size, in units of length_function
+        chunk_overlap (int): Maximum size of the messages repeated from the previous chunk
+        length_function (Callable[[str], int], optional): Size of a text, characters if omitted
+        
+    Returns:
+        List[Tuple[str, Dict]]: (chunk text, chunk metadata) pairs
+    """
+    if length_function is None:
+        sizes, separator_size = columns.line_lengths(), 1
+    else:
+        sizes = np.fromiter(
+            (length_function(columns.line(i)) for i in range(len(columns))),
+            dtype=np.int64, count=len(columns)
+        )
+        separator_size = length_function("\n")
+    
+    all_chunks = []
+    for start, end in conversations.tolist():
+        for first, last in chunk_ranges(sizes[start:end], chunk_size, chunk_overlap, separator_size):
+            first, last = start + first, start + last
+            chunk = columns.span(first, last)
+            metadata = {
+                "chunk_type": "conversation",
+                "message_count": last - first,
+                "length": len(chunk),
+                "start_time": str(from_epoch(columns.timestamps[first])),
+                "end_time": str(from_epoch(columns.timestamps[last - 1])),
+                "senders": columns.senders_between(first, last)
+            }
+            all_chunks.append((chunk, metadata))
+    return all_chunks
+
+def index_chunks(
+    all_chunks: List[Tuple[str, Dict]],
+    embeddings: CachedEmbeddings,
+    vector_store: Optional[FAISS],
+    store_path: str,
+    report: Callable[[str, Dict], None]
+) -> FAISS:
+    """Embed the chunks missing from the embedding cache in concurrent, rate-limited
+    batches, add them to the vector store (a new one if None) and save it under store_path"""
+    texts, metadatas = zip(*all_chunks)
+    vectors = embed_texts_cached(
+        embeddings, list(texts),
+        progress=lambda done, total: report("embedding", {"embedded": done, "total": total})
+    )
+    text_embeddings = list(zip(texts, vectors))
+    if vector_store is not None:
+        vector_store.add_embeddings(text_embeddings=text_embeddings, metadatas=list(metadatas))
+    else:
+        vector_store = FAISS.from_embeddings(
+            text_embeddings=text_embeddings,
+            embedding=embeddings,
+            metadatas=list(metadatas)
+        )
+    
+    # Save the FAISS index locally
+    save_compact(vector_store, store_path)
+    return vector_store
+
+def chat_id_for(first_message: WhatsAppMessage) -> str:
+    """Chat ID of an export; re-uploads of the same chat share their first message"""
+    return content_hash(str(first_message))[:16]
+
+def ingest_chat(
+    source: ChatSource,
+    incremental: bool = False,
+    store_root: str = Config.VECTOR_STORE_PATH,
+    progress: Optional[Callable[[str, Dict], None]] = None
+) -> Tuple[Optional[str], List[str]]:
+    """Ingest a WhatsApp chat export into the chat's own FAISS index.
+    
+    Args:
+        source (ChatSource): Path or binary file object of the export, either
+            the .txt file or a .zip holding it; it is parsed as it is read
+        incremental (bool): Embed and append only messages newer than the last
+            ingestion of the same chat instead of rebuilding the index
+        store_root (str): Directory holding one FAISS index per chat ID
+        progress (Callable[[str, Dict], None], optional): Called with each stage
+            reached ("parsed", "chunked", "embedding", "indexed") and its details
+        
+    Returns:
+        Tuple[Optional[str], List[str]]: The chat ID (None for an empty export)
+            and the unique sender names of the chat
+    """
     # Load and parse chat
     handler = WhatsAppMessageHandler()
-    chat_path = os.environ.get("CHAT_FILE_PATH", "/Users/guy.asulin/PersonalCodeBase/whatsapp_meme_maker/backend/_chat.txt")
-    messages = handler.parse_chat_file(chat_path)
+    messages = handler.iter_chat_file(source)
     
-    # Convert WhatsAppMessage objects to strings
-    message_strings = [str(message) for message in messages]
+    # The first message identifies the chat and keys its index and manifest
+    first_message = next(messages, None)
+    if first_message is None:
+        print("No messages found in the chat")
+        return None, []
+    chat_id = chat_id_for(first_message)
+    chat_key = content_hash(str(first_message))
+    store_path = os.path.join(store_root, chat_id)
+    messages = chain([first_message], messages)
     
-    # Extract unique senders
-    unique_senders = extract_unique_senders(message_strings)
+    # Chunk boundaries are deterministic, so re-ingested chunks are served from the cache
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"))
+    manifest = load_manifest(store_path)
+    previous = manifest["chats"].get(chat_key)
+    vector_store = None
+    if incremental and previous and os.path.exists(os.path.join(store_path, INDEX_FILE)):
+        vector_store = load_compact(store_path, embeddings, mmap=False)
+    else:
+        # Full rebuild: the index only ever holds the chat being ingested
+        previous = None
+        manifest = {"chats": {}}
+    
+    # Group messages into conversations with minimum 10 messages,
+    # extracting unique senders in the same streaming pass
+    senders = set()
+    messages = collect_senders(messages, senders)
+    if previous:
+        messages = skip_ingested_messages(
+            messages,
+            parse_iso_timestamp(previous["last_timestamp"]),
+            set(previous["boundary_hashes"])
+        )
+    columns = MessageColumns.from_messages(messages)
+    conversations = conversation_ranges(columns.timestamps, min_messages=10)
+    if not len(conversations) and len(columns) and not previous:
+        # A chat shorter than one conversation is indexed as a single conversation
+        conversations = np.asarray([[0, len(columns)]], dtype=np.int64)
+    report = progress or (lambda stage, details: None)
+    report("parsed", {
+        "conversations": len(conversations),
+        "messages": int((conversations[:, 1] - conversations[:, 0]).sum())
+    })
+    
+    unique_senders = sorted(senders)
     print(f"\nFound {len(unique_senders)} unique senders in the chat:")
     for sender in unique_senders:
         print(f"- {sender}")
     
-    # Group messages into conversations with minimum 10 messages
-    conversations = group_messages_by_conversation(message_strings, min_messages=10)
+    known_chunks = set(previous["chunk_hashes"]) if previous else set()
+    all_chunks = [
+        (chunk, metadata) for chunk, metadata in build_conversation_chunks(columns, conversations, length_function=chunk_length_function())
+        if content_hash(chunk) not in known_chunks
+    ]
     
-    # Create text splitter optimized for conversation context
-    text_splitter = RecursiveCharacterTextSplitter(
-        separators=["\n\n", "\n"],  # Simplified separators to keep more context
-        chunk_size=2000,  # Much larger chunks to keep conversations together
-        chunk_overlap=200,  # Increased overlap
-        length_function=len,
-        is_separator_regex=False
-    )
+    print(f"Split into {len(all_chunks)} {'new ' if previous else ''}conversation chunks")
+    report("chunked", {"chunks": len(all_chunks)})
+    if not all_chunks:
+        print("No new conversation chunks to index")
+        report("indexed", {"chunks": 0})
+        return chat_id, unique_senders
     
-    # Process each conversation group
-    all_chunks = []
-    for conv in conversations:
-        if len(conv) > 0:
-            text = "\n".join(conv)
-            chunks = text_splitter.split_text(text)
-            
-            # Get first and last timestamp for each chunk
-            for chunk in chunks:
-                chunk_messages = chunk.split("\n")
-                first_timestamp = extract_timestamp(chunk_messages[0])
-                last_timestamp = extract_timestamp(chunk_messages[-1])
-                
-                metadata = {
-                    "chunk_type": "conversation",
-                    "message_count": len(chunk_messages),
-                    "length": len(chunk),
-                    "start_time": first_timestamp.strftime("%Y-%m-%d %H:%M:%S") if first_timestamp else "unknown",
-                    "end_time": last_timestamp.strftime("%Y-%m-%d %H:%M:%S") if last_timestamp else "unknown"
-                }
-                all_chunks.append((chunk, metadata))
-    
-    print(f"Split into {len(all_chunks)} conversation chunks")
     print("\nFirst 5 chunks:")
     for chunk, metadata in all_chunks[:5]:
         print(f"\n--- Chunk (Messages: {metadata['message_count']}, Time: {metadata['start_time']} to {metadata['end_time']}) ---\n{chunk}")
     
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    index_chunks(all_chunks, embeddings, vector_store, store_path, report)
     
-    # Process in batches and create FAISS index
-    texts, metadatas = zip(*all_chunks)
-    vector_store = FAISS.from_texts(
-        texts=texts,
-        embedding=embeddings,
-        metadatas=list(metadatas)
+    # Keep the parsed messages next to the index, so they can be re-chunked
+    # and analyzed without the export
+    messages_path = os.path.join(store_path, MESSAGES_DIR)
+    if previous:
+        stored = load_columns(messages_path, mmap=False)
+        if stored is not None:
+            save_columns(MessageColumns.concatenate([stored, columns]), messages_path)
+        else:
+            print("No stored messages for this chat, re-ingest it without incremental to store them")
+    else:
+        save_columns(columns, messages_path)
+    
+    # Record where this ingestion stopped so the next one can resume from there
+    start, end = conversations[-1].tolist()
+    last_epoch = columns.timestamps[start:end].max()
+    last_timestamp = from_epoch(last_epoch)
+    boundary_hashes = [
+        content_hash(columns.line(start + i))
+        for i in np.flatnonzero(columns.timestamps[start:end] == last_epoch).tolist()
+    ]
+    if previous and previous["last_timestamp"] == str(last_timestamp):
+        boundary_hashes = previous["boundary_hashes"] + boundary_hashes
+    manifest["chats"][chat_key] = {
+        "last_timestamp": str(last_timestamp),
+        "boundary_hashes": boundary_hashes,
+        "chunk_hashes": sorted(known_chunks.union(content_hash(chunk) for chunk, _ in all_chunks))
+    }
+    save_manifest(store_path, manifest)
+    report("indexed", {"chunks": len(all_chunks)})
+    
+    print(f"Successfully saved {len(all_chunks)} conversation chunks to local FAISS index at {store_path}")
+    cache_stats = embeddings.stats()
+    print(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    return chat_id, unique_senders
+
+def reindex_chat(
+    chat_id: str,
+    store_root: str = Config.VECTOR_STORE_PATH,
+    chunk_size: int = Config.CHUNK_SIZE,
+    chunk_overlap: int = Config.CHUNK_OVERLAP,
+    chunk_unit: str = Config.CHUNK_UNIT,
+    min_messages: int = 10,
+    max_time_gap: int = 30,
+    progress: Optional[Callable[[str, Dict], None]] = None
+) -> int:
+    """Rebuild a chat's index with other grouping or chunking parameters from
+    its stored messages, without the export.
+    
+    Args:
+        chat_id (str): ID of an ingested chat
+        store_root (str): Directory holding one FAISS index per chat ID
+        chunk_size (int): Maximum chunk size, in chunk_unit
+        chunk_overlap (int): Maximum size of the messages repeated from the previous chunk
+        chunk_unit (str): "chars" or "tokens"
+        min_messages (int): Minimum number of messages per conversation
+        max_time_gap (int): Maximum time gap in minutes between messages
+        progress (Callable[[str, Dict], None], optional): Called with each stage
+            reached ("chunked", "embedding", "indexed") and its details
+        
+    Returns:
+        int: Number of chunks in the rebuilt index
+    """
+    store_path = os.path.join(store_root, chat_id)
+    columns = load_columns(os.path.join(store_path, MESSAGES_DIR))
+    if columns is None:
+        raise FileNotFoundError(f"No stored messages for chat {chat_id}")
+    
+    conversations = conversation_ranges(columns.timestamps, min_messages=min_messages, max_time_gap=max_time_gap)
+    if not len(conversations) and len(columns):
+        conversations = np.asarray([[0, len(columns)]], dtype=np.int64)
+    all_chunks = build_conversation_chunks(
+        columns, conversations, chunk_size, chunk_overlap, chunk_length_function(chunk_unit)
     )
+    report = progress or (lambda stage, details: None)
+    report("chunked", {"chunks": len(all_chunks)})
+    if not all_chunks:
+        raise ValueError(f"No stored messages for chat {chat_id}")
     
-    # Save the FAISS index locally
-    vector_store.save_local("backend/vector_store")
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"))
+    index_chunks(all_chunks, embeddings, None, store_path, report)
     
-    print(f"Successfully saved {len(all_chunks)} conversation chunks to local FAISS index")
+    # The ingested messages are unchanged, only the chunks the next incremental ingestion skips
+    manifest = load_manifest(store_path)
+    for entry in manifest["chats"].values():
+        entry["chunk_hashes"] = sorted({content_hash(chunk) for chunk, _ in all_chunks})
+    save_manifest(store_path, manifest)
+    report("indexed", {"chunks": len(all_chunks)})
+    return len(all_chunks)
+
+def main():
+    chat_path = os.environ.get("CHAT_FILE_PATH", "/Users/guy.asulin/PersonalCodeBase/whatsapp_meme_maker/backend/_chat.txt")
+    chat_id, unique_senders = ingest_chat(chat_path, incremental=Config.INGEST_INCREMENTAL)
+    print(f"Chat ID: {chat_id}")
     return unique_senders
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import Config
+from meme_parser import MemeFormat
+
+MEME_CACHE_VARIETIES = ("none", "text")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation, diacritics (e.g. niqqud) and whitespace insensitive form of a query"""
+    text = unicodedata.normalize("NFKD", query.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def cache_key(chat_id: str, normalized_query: str) -> str:
+    return hashlib.sha256(f"{chat_id}\0{normalized_query}".encode("utf-8")).hexdigest()
+
+
+class MemeCacheStore:
+    """
+    Storage backend of a MemeCache. An entry is a JSON-serializable dict with
+    chat_id, query, vector, created_at, used_at and result, stored next to
+    the rendered image bytes.
+    """
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        raise NotImplementedError
+
+    def put(self, key: str, entry: dict, image: bytes) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def touch(self, key: str, used_at: float) -> None:
+        raise NotImplementedError
+
+    def entries(self) -> Dict[str, dict]:
+        """All entries by key, without their image bytes"""
+        raise NotImplementedError
+
+
+class InMemoryMemeCacheStore(MemeCacheStore):
+    """Entries kept in process memory, lost on restart"""
+
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+        self._images: Dict[str, bytes] = {}
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        if key not in self._entries:
+            return None
+        return self._entries[key], self._images[key]
+
+    def put(self, key: str, entry: dict, image: bytes) -> None:
+        self._entries[key] = entry
+        self._images[key] = image
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._images.pop(key, None)
+
+    def touch(self, key: str, used_at: float) -> None:
+        if key in self._entries:
+            self._entries[key]["used_at"] = used_at
+
+    def entries(self) -> Dict[str, dict]:
+        return self._entries
+
+
+class LocalMemeCacheStore(MemeCacheStore):
+    """Entries in an index.json under `path` and images as one file per entry, shared across restarts"""
+
+    def __init__(self, path: str = Config.MEME_CACHE_PATH):
+        self.path = path
+        self._index_path = os.path.join(path, "index.json")
+        self._entries: Dict[str, dict] = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def _image_path(self, key: str) -> str:
+        return os.path.join(self.path, key + ".bin")
+
+    def _save_index(self) -> None:
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path)
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None or not os.path.exists(self._image_path(key)):
+            return None
+        with open(self._image_path(key), "rb") as f:
+            return entry, f.read()
+
+    def put(self, key: str, entry: dict, image: bytes) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._image_path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image)
+        os.replace(tmp_path, self._image_path(key))
+        self._entries[key] = entry
+        self._save_index()
+
+    def delete(self, key: str) -> None:
+        if self._entries.pop(key, None) is not None:
+            self._save_index()
+        if os.path.exists(self._image_path(key)):
+            os.remove(self._image_path(key))
+
+    def touch(self, key: str, used_at: float) -> None:
+        # Recency is persisted with the next index write
+        if key in self._entries:
+            self._entries[key]["used_at"] = used_at
+
+    def entries(self) -> Dict[str, dict]:
+        return self._entries
+
+
+class MemeCache:
+    """
+    Cache of generated memes per chat. A query is looked up by its normalized
+    form first and, failing that, by cosine similarity of its embedding to the
+    cached queries of the same chat. Entries expire `ttl` seconds after they
+    were generated and the least recently used are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        store: Optional[MemeCacheStore] = None,
+        ttl: float = Config.MEME_CACHE_TTL,
+        max_entries: int = Config.MEME_CACHE_MAX_ENTRIES,
+        similarity: float = Config.MEME_CACHE_SIMILARITY
+    ):
+        self.embeddings = embeddings
+        self.store = store or InMemoryMemeCacheStore()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._matrices: Dict[str, Tuple[List[str], np.ndarray]] = {}  # chat_id -> (keys, normalized vectors)
+        self._lock = threading.Lock()
+
+    def lookup(self, chat_id: str, query: str, vector: Optional[List[float]] = None) -> Tuple[Optional[dict], Optional[List[float]]]:
+        """
+        Return a cached meme result for the query (or None) and the query
+        embedding, if one was computed, so a miss can reuse it for retrieval.
+        Pass `vector` when the query has already been embedded.
+        """
+        with self._lock:
+            result = self._get_fresh(cache_key(chat_id, normalize_query(query)))
+            if result is not None:
+                self.exact_hits += 1
+                return result, None
+
+        if vector is None and self.similarity:
+            try:
+                vector = self.embeddings.embed_query(query)
+            except Exception as e:
+                print(f"Warning: could not embed query for the meme cache: {e}")
+
+        with self._lock:
+            if vector is not None:
+                key, score = self._nearest(chat_id, vector)
+                if key is not None and score >= self.similarity:
+                    result = self._get_fresh(key)
+                    if result is not None:
+                        self.semantic_hits += 1
+                        return result, vector
+            self.misses += 1
+        return None, vector
+
+    def put(self, chat_id: str, query: str, vector: Optional[List[float]], result: dict) -> None:
+        """Cache a generated meme result under the chat and query"""
+        now = time.time()
+        entry = {
+            "chat_id": chat_id,
+            "query": normalize_query(query),
+            "vector": [float(x) for x in vector] if vector is not None else None,
+            "created_at": now,
+            "used_at": now,
+            "result": self._freeze(result)
+        }
+        with self._lock:
+            self.store.put(cache_key(chat_id, entry["query"]), entry, result["meme_bytes"])
+            self._matrices.pop(chat_id, None)
+            self._evict()
+
+    def invalidate_chat(self, chat_id: str) -> None:
+        """Drop every cached meme of a chat, e.g. after it was re-ingested"""
+        with self._lock:
+            for key in [key for key, entry in self.store.entries().items() if entry["chat_id"] == chat_id]:
+                self.store.delete(key)
+            self._matrices.pop(chat_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss/eviction counters since this cache was created"""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self.store.entries()),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+        }
+
+    def _get_fresh(self, key: str) -> Optional[dict]:
+        stored = self.store.get(key)
+        if stored is None:
+            return None
+        entry, image = stored
+        now = time.time()
+        if now - entry["created_at"] > self.ttl:
+            self.store.delete(key)
+            self._matrices.pop(entry["chat_id"], None)
+            self.expired += 1
+            return None
+        self.store.touch(key, now)
+        return self._thaw(entry["result"], image)
+
+    def _nearest(self, chat_id: str, vector: List[float]) -> Tuple[Optional[str], float]:
+        """Most similar cached query of the chat by cosine similarity"""
+        query = np.asarray(vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        if chat_id not in self._matrices:
+            keyed = [
+                (key, entry["vector"]) for key, entry in self.store.entries().items()
+                if entry["chat_id"] == chat_id and entry["vector"] is not None and len(entry["vector"]) == len(query)
+            ]
+            matrix = np.asarray([v for _, v in keyed], dtype=np.float32).reshape(len(keyed), len(query))
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            self._matrices[chat_id] = ([key for key, _ in keyed], matrix)
+        keys, matrix = self._matrices[chat_id]
+        if not keys:
+            return None, -1.0
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        return keys[best], float(scores[best])
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        entries = self.store.entries()
+        now = time.time()
+        expired = [key for key, entry in entries.items() if now - entry["created_at"] > self.ttl]
+        expired_keys = set(expired)
+        by_recency = sorted(
+            (key for key in entries if key not in expired_keys),
+            key=lambda key: entries[key]["used_at"]
+        )
+        overflow = by_recency[:max(len(by_recency) - self.max_entries, 0)]
+        for key in expired + overflow:
+            self._matrices.pop(entries[key]["chat_id"], None)
+            self.store.delete(key)
+        self.expired += len(expired)
+        self.evicted += len(overflow)
+
+    @staticmethod
+    def _freeze(result: dict) -> dict:
+        """JSON-serializable copy of a meme result, without the image bytes"""
+        frozen = {key: value for key, value in result.items() if key not in ("meme_bytes", "meme_text")}
+        frozen["meme_text"] = {"top_text": result["meme_text"].top_text, "bottom_text": result["meme_text"].bottom_text}
+        return frozen
+
+    @staticmethod
+    def _thaw(frozen: dict, image: bytes) -> dict:
+        result = dict(frozen)
+        result["meme_text"] = MemeFormat(**frozen["meme_text"])
+        result["meme_bytes"] = image
+        return result
+
+
+_shared_cache: Optional[MemeCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_meme_cache(embeddings: Embeddings) -> MemeCache:
+    """Process-wide meme cache on the backend selected by MEME_CACHE_BACKEND ("memory" or "local")"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            if Config.MEME_CACHE_BACKEND == "local":
+                store = LocalMemeCacheStore()
+            elif Config.MEME_CACHE_BACKEND == "memory":
+                store = InMemoryMemeCacheStore()
+            else:
+                raise ValueError(f"Unknown meme cache backend: {Config.MEME_CACHE_BACKEND!r}")
+            _shared_cache = MemeCache(embeddings, store)
+        return _shared_cache
@@ -1,43 +1,196 @@
 from PIL import Image, ImageDraw, ImageFont
 import arabic_reshaper
 from bidi.algorithm import get_display
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
 import os
-from typing import Optional
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+# Encoder settings per output format: (PIL format, MIME type, file extension)
+OUTPUT_FORMATS = {
+    "JPEG": ("JPEG", "image/jpeg", ".jpg"),
+    "WEBP": ("WEBP", "image/webp", ".webp"),
+    "PNG": ("PNG", "image/png", ".png"),
+}
+
+def encode_image(
+    img: Image.Image,
+    output_format: str = Config.MEME_OUTPUT_FORMAT,
+    quality: int = Config.MEME_OUTPUT_QUALITY,
+    progressive: bool = Config.MEME_OUTPUT_PROGRESSIVE
+) -> bytes:
+    """Encode an image in memory as JPEG (optionally progressive), WebP or PNG"""
+    pil_format = OUTPUT_FORMATS[output_format.upper()][0]
+    options = {}
+    if pil_format == "JPEG":
+        options = {"quality": quality, "optimize": True, "progressive": progressive}
+    elif pil_format == "WEBP":
+        options = {"quality": quality, "method": 4}
+    buffer = BytesIO()
+    img.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+# Scripts that need arabic_reshaper's contextual joining (Arabic, Syriac,
+# Thaana, NKo and the Arabic presentation forms); Hebrew letters don't join
+_JOINING_SCRIPTS = re.compile("[\u0600-\u08ff\ufb50-\ufdff\ufe70-\ufeff]")
+
+@lru_cache(maxsize=1024)
+def reshape_rtl(text: str) -> str:
+    """
+    Reshape & reorder Hebrew/Arabic text so it displays properly without libraqm.
+    Memoized, since the same caption is shaped again for every re-render.
+    """
+    if _JOINING_SCRIPTS.search(text):
+        text = arabic_reshaper.reshape(text)
+    return get_display(text)
+
+class RenderTimer:
+    """Thread-safe per-step render timings: call count and total seconds by step name"""
+
+    def __init__(self):
+        self._totals: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                total = self._totals.setdefault(name, [0, 0.0])
+                total[0] += 1
+                total[1] += elapsed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, total and mean milliseconds per step"""
+        with self._lock:
+            return {
+                name: {"count": count, "total_ms": seconds * 1000, "mean_ms": seconds * 1000 / count}
+                for name, (count, seconds) in self._totals.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+# Width in pixels of the black outline around the white caption text
+STROKE_WIDTH = 2
+
+@lru_cache(maxsize=256)
+def _load_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """Load a font once per (path, size); FreeTypeFont objects are reusable across renders"""
+    return ImageFont.truetype(font_path, font_size)
+
+@lru_cache(maxsize=128)
+def _text_layer(font_path: str, font_size: int, text: str) -> Image.Image:
+    """
+    Transparent RGBA image of a stroked caption, drawn with its origin at
+    (STROKE_WIDTH, STROKE_WIDTH). Cached so the same caption at the same size
+    is rasterized once, e.g. when trying it on several templates.
+    """
+    font = _load_font(font_path, font_size)
+    _, _, right, bottom = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox(
+        (STROKE_WIDTH, STROKE_WIDTH), text, font=font, stroke_width=STROKE_WIDTH
+    )
+    layer = Image.new("RGBA", (right + STROKE_WIDTH, bottom + STROKE_WIDTH), (0, 0, 0, 0))
+    ImageDraw.Draw(layer).text(
+        (STROKE_WIDTH, STROKE_WIDTH), text, font=font, fill="white",
+        stroke_width=STROKE_WIDTH, stroke_fill="black"
+    )
+    return layer
 
 class MemeGenerator:
-    def __init__(self, font_path: Optional[str] = None):
+    def __init__(
+        self, font_path: Optional[str] = None,
+        template_cache_bytes: int = Config.MEME_TEMPLATE_CACHE_MAX_BYTES,
+        text_layers: bool = Config.MEME_TEXT_LAYERS
+    ):
         """
         Initialize the MemeGenerator with an optional custom font path.
         If no font path is provided, it will use a default system font.
+        Decoded templates are kept in an LRU of at most template_cache_bytes.
+        With text_layers, captions are rasterized once into cached transparent
+        layers and alpha-composited onto the template instead of drawn on it.
         """
         # A font that supports Hebrew (e.g. Arial Unicode, etc.)
         self.font_path = font_path or "utils/fonts/Arial_Unicode.ttf"
+        self.template_cache_bytes = template_cache_bytes
+        self.text_layers = text_layers
+        # Time spent per render step: template, shape, fit, draw and encode
+        self.timer = RenderTimer()
+        self._templates = OrderedDict()  # (path, mtime) -> decoded RGB image
+        self._templates_bytes = 0
+        self._templates_lock = threading.Lock()
+    
+    def _load_template(self, image_path: str) -> Image.Image:
+        """
+        Return a copy of the template decoded and converted to RGB, decoding
+        the file only if it isn't already in the in-memory LRU.
+        """
+        key = (image_path, os.stat(image_path).st_mtime_ns)
+        with self._templates_lock:
+            cached = self._templates.get(key)
+            if cached is not None:
+                self._templates.move_to_end(key)
+                return cached.copy()
         
+        with Image.open(image_path) as img:
+            # Convert to RGB if necessary
+            img = img.convert('RGB') if img.mode != 'RGB' else img.copy()
+        
+        size = img.width * img.height * 3
+        with self._templates_lock:
+            if key not in self._templates and size <= self.template_cache_bytes:
+                self._templates[key] = img
+                self._templates_bytes += size
+                while self._templates_bytes > self.template_cache_bytes:
+                    _, evicted = self._templates.popitem(last=False)
+                    self._templates_bytes -= evicted.width * evicted.height * 3
+        return img.copy()
+    
     
     def _reshape_rtl(self, text: str) -> str:
         """
         Reshape & reorder Hebrew/Arabic text so it displays properly without libraqm.
         """
-        # If you only have Hebrew letters/spaces (no punctuation), you can
-        # skip arabic_reshaper; just do: return get_display(text).
-        reshaped_text = arabic_reshaper.reshape(text)
-        bidi_text = get_display(reshaped_text)
-        return bidi_text
+        return reshape_rtl(text)
     
-    def _get_same_font_size(
+    def _measure_lines(
+        self, top_text: str, bottom_text: str, font_size: int, draw: ImageDraw.Draw
+    ) -> Tuple[int, int, int, int]:
+        """Measure (top_w, top_h, bottom_w, bottom_h) of both lines at a font size"""
+        font = _load_font(self.font_path, font_size)
+        top_bbox = draw.textbbox((0, 0), top_text, font=font)
+        bottom_bbox = draw.textbbox((0, 0), bottom_text, font=font)
+        return (
+            top_bbox[2] - top_bbox[0], top_bbox[3] - top_bbox[1],
+            bottom_bbox[2] - bottom_bbox[0], bottom_bbox[3] - bottom_bbox[1]
+        )
+    
+    def _fit_font_size(
         self, top_text: str, bottom_text: str, 
         width: int, height: int, draw: ImageDraw.Draw,
         max_width_ratio: float = 0.9, 
         top_bottom_margin_ratio: float = 0.1
-    ) -> int:
+    ) -> Tuple[int, Dict[int, Tuple[int, int, int, int]]]:
         """
-        Find the largest single font size S that fits BOTH lines in:
-          - <= max_width_ratio * width
-          - The total height for both lines (plus a small gap) 
-            fits within the height minus top/bottom margins.
+        Find the largest font size that fits both lines (see _get_same_font_size).
+        Text extent grows roughly linearly with the font size, so one measurement
+        at a reference size gives an estimate; the exact size is then found by
+        galloping from the estimate and binary searching the bracketing interval,
+        which takes a handful of measurements instead of one per size.
 
         Returns:
-            int: The largest font size that fits the criteria.
+            Tuple: The font size and the line measurements taken, keyed by size.
         """
         # The maximum available width for text:
         max_text_width = width * max_width_ratio
@@ -46,89 +199,172 @@ class MemeGenerator:
         # after leaving top_bottom_margin_ratio from top & bottom.
         vertical_space = height * (1 - 2 * top_bottom_margin_ratio)
         
-        font_size = 1
-        best_size = 1
         gap = 10  # some gap/padding between the two lines, in pixels
+        max_size = max(width, height)  # bounds the search for (near) empty text
+        measurements = {}
 
-        while True:
-            font = ImageFont.truetype(self.font_path, font_size)
-            
-            # Measure the two lines
-            top_bbox = draw.textbbox((0, 0), top_text, font=font)
-            top_w = top_bbox[2] - top_bbox[0]
-            top_h = top_bbox[3] - top_bbox[1]
-
-            bottom_bbox = draw.textbbox((0, 0), bottom_text, font=font)
-            bottom_w = bottom_bbox[2] - bottom_bbox[0]
-            bottom_h = bottom_bbox[3] - bottom_bbox[1]
-
-            # Check widths
-            if top_w > max_text_width or bottom_w > max_text_width:
-                break
-            
-            # Check total height usage
-            total_text_height = top_h + gap + bottom_h
-            if total_text_height > vertical_space:
-                break
-
-            best_size = font_size
-            font_size += 1
-        
-        return best_size
+        def fits(font_size: int) -> bool:
+            if font_size not in measurements:
+                measurements[font_size] = self._measure_lines(top_text, bottom_text, font_size, draw)
+            top_w, top_h, bottom_w, bottom_h = measurements[font_size]
+            # Check widths and total height usage
+            return (
+                top_w <= max_text_width and bottom_w <= max_text_width
+                and top_h + gap + bottom_h <= vertical_space
+            )
+
+        # Estimate the size from a measurement at a reference size
+        reference_size = 32
+        fits(reference_size)
+        top_w, top_h, bottom_w, bottom_h = measurements[reference_size]
+        scale = min(
+            max_text_width / max(top_w, bottom_w, 1),
+            max(vertical_space - gap, 0) / max(top_h + bottom_h, 1)
+        )
+        guess = min(max(int(reference_size * scale), 1), max_size)
+
+        # Gallop away from the guess until the answer is bracketed.
+        # Invariant: lo fits (or is the minimum size 1), hi doesn't fit
+        step = 1
+        if fits(guess):
+            lo, hi = guess, guess + 1
+            while hi <= max_size and fits(hi):
+                lo, step = hi, step * 2
+                hi = lo + step
+            hi = min(hi, max_size + 1)
+        else:
+            lo, hi = guess - 1, guess
+            while lo > 1 and not fits(lo):
+                hi, step = lo, step * 2
+                lo = max(hi - step, 1)
+            if lo < 1 or not fits(lo):
+                fits(1)
+                return 1, measurements
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid
+        return lo, measurements
+    
+    def _get_same_font_size(
+        self, top_text: str, bottom_text: str, 
+        width: int, height: int, draw: ImageDraw.Draw,
+        max_width_ratio: float = 0.9, 
+        top_bottom_margin_ratio: float = 0.1
+    ) -> int:
+        """
+        Find the largest single font size S that fits BOTH lines in:
+          - <= max_width_ratio * width
+          - The total height for both lines (plus a small gap) 
+            fits within the height minus top/bottom margins.
+
+        Returns:
+            int: The largest font size that fits the criteria.
+        """
+        font_size, _ = self._fit_font_size(
+            top_text, bottom_text, width, height, draw, max_width_ratio, top_bottom_margin_ratio
+        )
+        return font_size
     
     def create_meme(self, image_path: str, top_text: str, bottom_text: str, output_path: str) -> str:
+        """Render a meme onto the template at image_path, starting from the decoded template cache"""
+        with self.timer.step("template"):
+            template = self._load_template(image_path)
+        img = self._render(template, top_text, bottom_text)
+        with self.timer.step("encode"):
+            img.save(output_path, quality=95)
+        return output_path
+    
+    def create_meme_from_image(self, image: Image.Image, top_text: str, bottom_text: str, output_path: str) -> str:
+        """Render a meme onto an in-memory template image, which is left unmodified"""
+        img = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+        img = self._render(img, top_text, bottom_text)
+        with self.timer.step("encode"):
+            img.save(output_path, quality=95)
+        return output_path
+    
+    def render_meme(
+        self, image_path: str, top_text: str, bottom_text: str,
+        output_format: str = Config.MEME_OUTPUT_FORMAT,
+        quality: int = Config.MEME_OUTPUT_QUALITY,
+        progressive: bool = Config.MEME_OUTPUT_PROGRESSIVE
+    ) -> bytes:
+        """Render a meme and return the encoded image bytes without touching the disk"""
+        with self.timer.step("template"):
+            template = self._load_template(image_path)
+        img = self._render(template, top_text, bottom_text)
+        with self.timer.step("encode"):
+            return encode_image(img, output_format, quality, progressive)
+    
+    def render_meme_from_image(
+        self, image: Image.Image, top_text: str, bottom_text: str,
+        output_format: str = Config.MEME_OUTPUT_FORMAT,
+        quality: int = Config.MEME_OUTPUT_QUALITY,
+        progressive: bool = Config.MEME_OUTPUT_PROGRESSIVE
+    ) -> bytes:
+        """Render a meme onto an in-memory template image and return the encoded bytes"""
+        img = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+        img = self._render(img, top_text, bottom_text)
+        with self.timer.step("encode"):
+            return encode_image(img, output_format, quality, progressive)
+    
+    def _render(self, img: Image.Image, top_text: str, bottom_text: str) -> Image.Image:
+        """Draw the captions onto an RGB image owned by the caller and return it"""
         # 1) Reshape text for RTL
-        top_text = self._reshape_rtl(top_text)
-        bottom_text = self._reshape_rtl(bottom_text)
+        with self.timer.step("shape"):
+            top_text = self._reshape_rtl(top_text)
+            bottom_text = self._reshape_rtl(bottom_text)
         
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            draw = ImageDraw.Draw(img)
-            
-            width, height = img.size
-
-            # 2) Determine a single font size that fits both lines
-            font_size = self._get_same_font_size(top_text, bottom_text, width, height, draw)
-            font = ImageFont.truetype(self.font_path, font_size)
-            
-            # 3) Measure actual bounding boxes with that font
-            gap = 10  # gap between top and bottom text
-            top_bbox = draw.textbbox((0, 0), top_text, font=font)
-            top_w = top_bbox[2] - top_bbox[0]
-            top_h = top_bbox[3] - top_bbox[1]
-
-            bottom_bbox = draw.textbbox((0, 0), bottom_text, font=font)
-            bottom_w = bottom_bbox[2] - bottom_bbox[0]
-            bottom_h = bottom_bbox[3] - bottom_bbox[1]
-
-            # 4) Decide vertical positions so they're not cropped
-            #    We’ll place top text ~10% from the top, bottom text ~10% from the bottom.
-            margin_y = int(height * 0.1)  # 10% margin from top/bottom
-            top_y = margin_y  # top line starts 10% down
-            bottom_y = height - margin_y - bottom_h  # bottom line ends 10% from the bottom
-
-            # 5) Center horizontally
-            top_x = (width - top_w) // 2
-            bottom_x = (width - bottom_w) // 2
-            
-            # 6) Draw the top text with outline/stroke
-            stroke_width = 2
-            for offset in [(-stroke_width, 0), (stroke_width, 0), (0, -stroke_width), (0, stroke_width)]:
-                draw.text((top_x + offset[0], top_y + offset[1]), top_text, font=font, fill="black")
-            draw.text((top_x, top_y), top_text, font=font, fill="white")
-            
-            # 7) Draw the bottom text with outline/stroke
-            for offset in [(-stroke_width, 0), (stroke_width, 0), (0, -stroke_width), (0, stroke_width)]:
-                draw.text((bottom_x + offset[0], bottom_y + offset[1]), bottom_text, font=font, fill="black")
-            draw.text((bottom_x, bottom_y), bottom_text, font=font, fill="white")
-            
-            # 8) Save the meme
-            img.save(output_path, quality=95)
+        draw = ImageDraw.Draw(img)
         
-        return output_path
+        width, height = img.size
+
+        # 2) Determine a single font size that fits both lines
+        with self.timer.step("fit"):
+            font_size, measurements = self._fit_font_size(top_text, bottom_text, width, height, draw)
+        font = _load_font(self.font_path, font_size)
+        
+        # 3) Reuse the bounding boxes measured with that font during the search
+        top_w, top_h, bottom_w, bottom_h = measurements[font_size]
+
+        # 4) Decide vertical positions so they're not cropped
+        #    We’ll place top text ~10% from the top, bottom text ~10% from the bottom.
+        margin_y = int(height * 0.1)  # 10% margin from top/bottom
+        top_y = margin_y  # top line starts 10% down
+        bottom_y = height - margin_y - bottom_h  # bottom line ends 10% from the bottom
+
+        # 5) Center horizontally
+        top_x = (width - top_w) // 2
+        bottom_x = (width - bottom_w) // 2
+        
+        # 6) Draw both lines white with a black outline, one stroked pass each
+        with self.timer.step("draw"):
+            if self.text_layers:
+                return self._composite_text(img, [
+                    (_text_layer(self.font_path, font_size, top_text), top_x, top_y),
+                    (_text_layer(self.font_path, font_size, bottom_text), bottom_x, bottom_y),
+                ])
+            for x, y, text in ((top_x, top_y, top_text), (bottom_x, bottom_y, bottom_text)):
+                draw.text((x, y), text, font=font, fill="white", stroke_width=STROKE_WIDTH, stroke_fill="black")
+        
+        return img
+    
+    @staticmethod
+    def _composite_text(img: Image.Image, layers) -> Image.Image:
+        """Alpha-composite (layer, x, y) text layers onto an RGB image, where (x, y) is the text origin"""
+        canvas = img.convert("RGBA")
+        for layer, x, y in layers:
+            # Layers are padded by the stroke width around the text origin;
+            # clip whatever would fall outside the top or left edge
+            dest_x, dest_y = x - STROKE_WIDTH, y - STROKE_WIDTH
+            canvas.alpha_composite(
+                layer,
+                dest=(max(dest_x, 0), max(dest_y, 0)),
+                source=(max(-dest_x, 0), max(-dest_y, 0))
+            )
+        return canvas.convert("RGB")
 
 
 if __name__ == "__main__":
@@ -6,6 +6,12 @@ class MemeFormat(BaseModel):
     top_text: str = Field(description="The text that appears at the top of the meme")
     bottom_text: str = Field(description="The text that appears at the bottom of the meme")
 
+class FusedMemeFormat(MemeFormat):
+    """Template choice and meme text returned together by a single LLM call"""
+    template_id: str = Field(description="ID of the selected meme template")
+    explanation: str = Field(description="Why this template was chosen and how it should be used")
+    typical_format: str = Field(default="", description="How text is typically formatted for this template")
+
 class MemeOutputParser(BaseOutputParser):
     """Parser for meme format with top and bottom text."""
     
@@ -20,6 +26,19 @@ class MemeOutputParser(BaseOutputParser):
 
     def parse(self, text: str) -> MemeFormat:
         """Parse the output into a MemeFormat object."""
+        json_object = self._parse_json(text)
+        try:
+            # Convert to MemeFormat
+            return MemeFormat(
+                top_text=json_object["top_text"],
+                bottom_text=json_object["bottom_text"]
+            )
+        except Exception as e:
+            print(f"Full error details: {str(e)}")
+            raise ValueError(f"Failed to parse meme output: {str(e)}")
+
+    def _parse_json(self, text: str) -> Dict[str, Any]:
+        """Extract and decode the JSON object in the LLM output, tolerating code fences."""
         try:
             # Debug print
             print("Raw text received:", text)
@@ -47,11 +66,7 @@ class MemeOutputParser(BaseOutputParser):
                 print(f"Problem portion: {cleaned_text[max(0, e.pos-20):min(len(cleaned_text), e.pos+20)]}")
                 raise
             
-            # Convert to MemeFormat
-            return MemeFormat(
-                top_text=json_object["top_text"],
-                bottom_text=json_object["bottom_text"]
-            )
+            return json_object
         except Exception as e:
             print(f"Full error details: {str(e)}")
             raise ValueError(f"Failed to parse meme output: {str(e)}")
@@ -62,4 +77,34 @@ class MemeOutputParser(BaseOutputParser):
             meme_format = self.parse(text)
             return f"TOP TEXT: {meme_format.top_text}\nBOTTOM TEXT: {meme_format.bottom_text}"
         except Exception as e:
-            return f"Error parsing meme: {str(e)}\nRaw text was: {text}" 
\ No newline at end of file
+            return f"Error parsing meme: {str(e)}\nRaw text was: {text}"
+
+class FusedMemeOutputParser(MemeOutputParser):
+    """Parser for a single response holding both the template choice and the meme text."""
+
+    def get_format_instructions(self) -> str:
+        return """Your response should select a meme template and write its text.
+        Use the following JSON format:
+        {
+            "template_id": "id of the selected template",
+            "explanation": "why this template fits",
+            "typical_format": "how text is typically formatted for this template",
+            "top_text": "text that goes on top",
+            "bottom_text": "text that goes on bottom"
+        }
+        """
+
+    def parse(self, text: str) -> FusedMemeFormat:
+        """Parse the output into a FusedMemeFormat object."""
+        json_object = self._parse_json(text)
+        try:
+            return FusedMemeFormat(
+                template_id=str(json_object["template_id"]),
+                explanation=json_object["explanation"],
+                typical_format=json_object.get("typical_format", ""),
+                top_text=json_object["top_text"],
+                bottom_text=json_object["bottom_text"]
+            )
+        except Exception as e:
+            print(f"Full error details: {str(e)}")
+            raise ValueError(f"Failed to parse fused meme output: {str(e)}")
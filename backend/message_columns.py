@@ -0,0 +1,281 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from compact_vector_store import _replace_atomically
+from whatsapp_handler import WhatsAppMessage
+
+# Export timestamps carry no time zone; they are stored as seconds since this naive epoch
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+# Directory of a chat's stored messages, next to its index
+MESSAGES_DIR = "messages"
+TIMESTAMPS_FILE = "timestamps.npy"
+SENDER_IDS_FILE = "sender_ids.npy"
+TYPE_IDS_FILE = "type_ids.npy"
+LENGTHS_FILE = "lengths.npy"
+LINES_FILE = "lines.bin"
+LINE_OFFSETS_FILE = "line_offsets.npy"
+DICTIONARIES_FILE = "dictionaries.json"
+
+
+def to_epoch(timestamp: datetime) -> int:
+    """Seconds since 1970-01-01 of a naive export timestamp"""
+    return (timestamp - _EPOCH) // _SECOND
+
+
+def from_epoch(seconds: int) -> datetime:
+    """Naive timestamp of seconds since 1970-01-01, the inverse of to_epoch"""
+    return _EPOCH + timedelta(seconds=int(seconds))
+
+
+class MessageColumns:
+    """
+    Parsed messages of a chat as parallel arrays instead of message objects:
+    the timestamps in epoch seconds, the senders and message types as indices
+    into lists of names, and the formatted lines (str(message)) as one UTF-8
+    buffer joined by newlines, with `offsets[i]` the byte offset of line i,
+    `offsets[-1]` one past the end of the buffer and `lengths[i]` the length
+    of line i in characters.
+
+    Runs of messages (e.g. conversations) are index ranges [start, end) whose
+    text is a single slice of the buffer. The buffer may be a memory-mapped
+    uint8 array, see load_columns.
+    """
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        sender_ids: np.ndarray,
+        senders: List[str],
+        type_ids: np.ndarray,
+        message_types: List[str],
+        text: Union[bytes, np.ndarray],
+        offsets: np.ndarray,
+        lengths: np.ndarray
+    ):
+        self.timestamps = timestamps  # int64, one per message
+        self.sender_ids = sender_ids  # int32, one per message
+        self.senders = senders  # Sender names, in order of first message
+        self.type_ids = type_ids  # int8, one per message
+        self.message_types = message_types  # Message types, in order of first message
+        self.text = text
+        self.offsets = offsets  # int64, one per message plus the end
+        self.lengths = lengths  # int32, one per message
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[WhatsAppMessage]) -> "MessageColumns":
+        """Build the columns in a single pass over the messages"""
+        timestamps: List[int] = []
+        sender_ids: List[int] = []
+        sender_index: Dict[str, int] = {}
+        type_ids: List[int] = []
+        type_index: Dict[str, int] = {}
+        lengths: List[int] = []
+        lines: List[bytes] = []
+        for message in messages:
+            line = str(message)
+            timestamps.append(to_epoch(message.timestamp))
+            sender_ids.append(sender_index.setdefault(message.sender, len(sender_index)))
+            type_ids.append(type_index.setdefault(message.message_type, len(type_index)))
+            lengths.append(len(line))
+            lines.append(line.encode("utf-8"))
+        offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum([len(line) + 1 for line in lines], out=offsets[1:])
+        return cls(
+            np.asarray(timestamps, dtype=np.int64), np.asarray(sender_ids, dtype=np.int32), list(sender_index),
+            np.asarray(type_ids, dtype=np.int8), list(type_index),
+            b"\n".join(lines), offsets, np.asarray(lengths, dtype=np.int32)
+        )
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["MessageColumns"]) -> "MessageColumns":
+        """The messages of the parts, in order, with their sender and type dictionaries merged"""
+        parts = [part for part in parts if len(part)]
+        sender_index: Dict[str, int] = {}
+        type_index: Dict[str, int] = {}
+        sender_ids, type_ids, offsets = [], [], []
+        base = 0
+        for part in parts:
+            sender_map = np.asarray([sender_index.setdefault(name, len(sender_index)) for name in part.senders], dtype=np.int32)
+            type_map = np.asarray([type_index.setdefault(name, len(type_index)) for name in part.message_types], dtype=np.int8)
+            sender_ids.append(sender_map[part.sender_ids])
+            type_ids.append(type_map[part.type_ids])
+            offsets.append(np.asarray(part.offsets[:-1]) + base)
+            base += int(part.offsets[-1])
+        offsets.append(np.asarray([base], dtype=np.int64))
+        return cls(
+            np.concatenate([np.asarray(part.timestamps) for part in parts] or [np.empty(0, dtype=np.int64)]),
+            np.concatenate(sender_ids or [np.empty(0, dtype=np.int32)]), list(sender_index),
+            np.concatenate(type_ids or [np.empty(0, dtype=np.int8)]), list(type_index),
+            b"\n".join(bytes(part.text) for part in parts), np.concatenate(offsets),
+            np.concatenate([np.asarray(part.lengths) for part in parts] or [np.empty(0, dtype=np.int32)])
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def line(self, index: int) -> str:
+        """Formatted line of a message, as str(message)"""
+        return self.span(index, index + 1)
+
+    def span(self, start: int, end: int) -> str:
+        """Lines of the messages in [start, end) joined by newlines"""
+        if end <= start:
+            return ""
+        return bytes(self.text[self.offsets[start]:self.offsets[end] - 1]).decode("utf-8")
+
+    def line_lengths(self) -> np.ndarray:
+        """Character length of every formatted line"""
+        return self.lengths
+
+    def senders_between(self, start: int, end: int) -> List[str]:
+        """Sorted names of the senders of the messages in [start, end)"""
+        return sorted({self.senders[i] for i in self.sender_ids[start:end].tolist()})
+
+
+def conversation_ranges(timestamps: np.ndarray, min_messages: int = 10, max_time_gap: int = 30) -> np.ndarray:
+    """
+    Group messages into conversations by time gaps, as index ranges.
+
+    A conversation ends before a message sent more than `max_time_gap` minutes
+    after the previous one, once it has at least `min_messages` messages. A
+    trailing conversation shorter than that is merged into the previous one,
+    and a chat with fewer messages than that in total has no conversations.
+
+    Args:
+        timestamps (np.ndarray): Epoch seconds of the messages, in chat order
+        min_messages (int): Minimum number of messages per conversation
+        max_time_gap (int): Maximum time gap in minutes between messages
+
+    Returns:
+        np.ndarray: (conversations, 2) int64 array of [start, end) message indices
+    """
+    n = len(timestamps)
+    # Messages that may open a conversation, found in one vectorized pass
+    candidates = np.flatnonzero(np.diff(timestamps) > max_time_gap * 60) + 1
+    starts = [0]
+    while True:
+        # The next boundary is the first candidate leaving min_messages behind it
+        j = int(np.searchsorted(candidates, starts[-1] + max(min_messages, 1)))
+        if j == len(candidates):
+            break
+        starts.append(int(candidates[j]))
+
+    if n - starts[-1] < min_messages:
+        if len(starts) == 1:
+            return np.empty((0, 2), dtype=np.int64)
+        starts.pop()
+    bounds = np.asarray(starts + [n], dtype=np.int64)
+    return np.column_stack((bounds[:-1], bounds[1:]))
+
+
+def chunk_ranges(sizes: np.ndarray, chunk_size: int, chunk_overlap: int, separator_size: int = 1) -> Iterator[Tuple[int, int]]:
+    """
+    Pack consecutive messages into chunks of whole messages.
+
+    Each chunk takes as many messages as fit in `chunk_size`, counting a
+    separator between messages; a message larger than that is a chunk of its
+    own. The next chunk starts with the trailing messages of the previous one
+    that fit in `chunk_overlap`, as long as the message after them still fits.
+
+    Args:
+        sizes (np.ndarray): Size of each message, e.g. in characters or tokens
+        chunk_size (int): Maximum size of a chunk
+        chunk_overlap (int): Maximum size of the messages repeated from the previous chunk
+        separator_size (int): Size of the separator joining two messages
+
+    Yields:
+        Tuple[int, int]: [start, end) indices of the messages of each chunk
+    """
+    n = len(sizes)
+    # The messages [i, j) measure ends[j] - ends[i] - separator_size
+    ends = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.asarray(sizes, dtype=np.int64) + separator_size, out=ends[1:])
+    start = 0
+    while start < n:
+        end = int(np.searchsorted(ends, ends[start] + chunk_size + separator_size, side="right")) - 1
+        end = min(max(end, start + 1), n)
+        yield start, end
+        if end == n:
+            break
+        overlap_start = int(np.searchsorted(ends, max(
+            ends[end] - separator_size - chunk_overlap,
+            ends[end + 1] - separator_size - chunk_size
+        )))
+        start = min(max(overlap_start, start + 1), end)
+
+
+def save_columns(columns: MessageColumns, path: str) -> None:
+    """Save message columns as one .npy file per array, the UTF-8 lines and the dictionaries"""
+    os.makedirs(path, exist_ok=True)
+
+    def write_array(array):
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.asarray(array))
+        return write
+
+    def write_lines(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(memoryview(columns.text))
+
+    def write_dictionaries(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"senders": columns.senders, "message_types": columns.message_types}, f, ensure_ascii=False)
+
+    for name, array in (
+        (TIMESTAMPS_FILE, columns.timestamps),
+        (SENDER_IDS_FILE, columns.sender_ids),
+        (TYPE_IDS_FILE, columns.type_ids),
+        (LENGTHS_FILE, columns.lengths),
+        (LINE_OFFSETS_FILE, columns.offsets)
+    ):
+        _replace_atomically(os.path.join(path, name), write_array(array))
+    _replace_atomically(os.path.join(path, LINES_FILE), write_lines)
+    # Written last: its presence marks a complete set of columns
+    _replace_atomically(os.path.join(path, DICTIONARIES_FILE), write_dictionaries)
+
+
+def load_columns(path: str, mmap: bool = True) -> Optional[MessageColumns]:
+    """
+    Load message columns saved by save_columns, or None if there are none at
+    `path`. With `mmap`, the arrays and the lines are memory-mapped, so only
+    the pages a computation touches are read.
+    """
+    if not os.path.exists(os.path.join(path, DICTIONARIES_FILE)):
+        return None
+    with open(os.path.join(path, DICTIONARIES_FILE), 'r', encoding='utf-8') as f:
+        dictionaries = json.load(f)
+    timestamps, sender_ids, type_ids, lengths, offsets = (
+        np.load(os.path.join(path, name), mmap_mode='r' if mmap else None)
+        for name in (TIMESTAMPS_FILE, SENDER_IDS_FILE, TYPE_IDS_FILE, LENGTHS_FILE, LINE_OFFSETS_FILE)
+    )
+    lines_path = os.path.join(path, LINES_FILE)
+    if mmap and os.path.getsize(lines_path):
+        text = np.memmap(lines_path, dtype=np.uint8, mode='r')
+    else:
+        with open(lines_path, 'rb') as f:
+            text = f.read()
+    return MessageColumns(
+        timestamps, sender_ids, dictionaries["senders"], type_ids, dictionaries["message_types"],
+        text, offsets, lengths
+    )
+
+
+def message_stats(columns: MessageColumns) -> Dict:
+    """Message counts of a chat by sender and by type, its time span and number of active days"""
+    by_sender = np.bincount(columns.sender_ids, minlength=len(columns.senders)).tolist()
+    by_type = np.bincount(columns.type_ids, minlength=len(columns.message_types)).tolist()
+    return {
+        "messages": len(columns),
+        "first_message": str(from_epoch(columns.timestamps.min())) if len(columns) else None,
+        "last_message": str(from_epoch(columns.timestamps.max())) if len(columns) else None,
+        "active_days": int(np.unique(columns.timestamps // 86400).size),
+        "messages_by_sender": dict(sorted(zip(columns.senders, by_sender), key=lambda item: -item[1])),
+        "messages_by_type": dict(sorted(zip(columns.message_types, by_type), key=lambda item: -item[1]))
+    }
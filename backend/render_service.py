@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Optional
+
+from config import Config
+from meme_generator import MemeGenerator, _load_font
+
+# Font sizes loaded into every worker up front, covering the usual fitted sizes
+PRELOAD_FONT_SIZES = range(12, 129)
+
+# The MemeGenerator of the current worker process, set up by _init_worker
+_worker_generator: Optional[MemeGenerator] = None
+
+
+def _init_worker(font_path: str, template_cache_bytes: int, template_paths: tuple) -> None:
+    """Create the worker's generator and warm its font and decoded template caches"""
+    global _worker_generator
+    _worker_generator = MemeGenerator(font_path, template_cache_bytes)
+    for font_size in PRELOAD_FONT_SIZES:
+        _load_font(font_path, font_size)
+    for template_path in template_paths:
+        try:
+            _worker_generator._load_template(template_path)
+        except OSError as e:
+            print(f"Warning: could not preload template {template_path}: {e}")
+
+
+def _render_in_worker(
+    template_path: str, top_text: str, bottom_text: str,
+    output_format: str, quality: int, progressive: bool
+) -> bytes:
+    return _worker_generator.render_meme(template_path, top_text, bottom_text, output_format, quality, progressive)
+
+
+class RenderService:
+    """
+    Renders memes on a pool of worker processes, so rasterization and encoding
+    run in parallel instead of contending for the GIL of the web worker.
+
+    Each worker keeps its own MemeGenerator, with fonts and the given template
+    images loaded when the worker starts. Jobs take a template path rather than
+    an image, so only the path, the captions and the encoded bytes cross
+    process boundaries.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = Config.RENDER_WORKERS,
+        font_path: Optional[str] = None,
+        template_cache_bytes: int = Config.MEME_TEMPLATE_CACHE_MAX_BYTES,
+        template_paths: Iterable[str] = ()
+    ):
+        self.font_path = font_path or MemeGenerator().font_path
+        # Spawned workers don't inherit locks held by the web server's threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.font_path, template_cache_bytes, tuple(template_paths))
+        )
+
+    def submit(
+        self, template_path: str, top_text: str, bottom_text: str,
+        output_format: str = Config.MEME_OUTPUT_FORMAT,
+        quality: int = Config.MEME_OUTPUT_QUALITY,
+        progressive: bool = Config.MEME_OUTPUT_PROGRESSIVE
+    ) -> Future:
+        """Queue a render; the future resolves to the encoded image bytes"""
+        return self._executor.submit(
+            _render_in_worker, template_path, top_text, bottom_text, output_format, quality, progressive
+        )
+
+    def render(self, template_path: str, top_text: str, bottom_text: str, **options) -> bytes:
+        """Render on a worker and wait for the encoded image bytes"""
+        return self.submit(template_path, top_text, bottom_text, **options).result()
+
+    async def arender(self, template_path: str, top_text: str, bottom_text: str, **options) -> bytes:
+        """Async version of render"""
+        return await asyncio.wrap_future(self.submit(template_path, top_text, bottom_text, **options))
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,98 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import Config
+from embedding_cache import CachedEmbeddings
+from imgflip_api import ImgflipAPI
+
+# How popular templates are typically used, to embed alongside their names
+TEMPLATE_USAGE = {
+    "Drake Hotline Bling": "rejecting one option and preferring another, comparison of a bad choice versus a good choice",
+    "Two Buttons": "struggling to choose between two conflicting options, a hard dilemma",
+    "Disaster Girl": "smiling while causing chaos or disaster, someone secretly responsible for a mess",
+    "Batman Slapping Robin": "shutting down a bad or annoying statement, slapping someone for a dumb comment",
+    "Left Exit 12 Off Ramp": "abruptly choosing the unexpected or irresponsible option",
+    "Running Away Balloon": "being pulled away from what you want by someone or something",
+    "Buff Doge vs. Cheems": "strong confident past versus weak modern version, then versus now",
+    "UNO Draw 25 Cards": "someone would rather suffer a penalty than do a simple thing",
+    "Bernie I Am Once Again Asking For Your Financial Support": "asking for the same thing yet again",
+    "One Does Not Simply": "something that is much harder than it sounds",
+    "Change My Mind": "a strong, controversial personal opinion",
+    "Sad Pablo Escobar": "waiting alone, bored or lonely, nobody showed up",
+    "Waiting Skeleton": "waiting forever for someone who is always late",
+    "Hide the Pain Harold": "pretending everything is fine while suffering",
+    "Mocking Spongebob": "mocking or repeating what someone said in a sarcastic tone",
+    "Woman Yelling At Cat": "an angry accusation met with an indifferent or confused reaction",
+    "Ancient Aliens": "absurd explanation that blames something unlikely",
+    "Surprised Pikachu": "shocked by an obvious, predictable consequence",
+    "X, X Everywhere": "something that shows up everywhere",
+    "Epic Handshake": "two different groups agreeing on one thing",
+}
+
+
+class TemplateIndex:
+    """
+    In-memory matrix of normalized template embeddings (name plus typical usage)
+    used to pre-rank templates for a query by a single vectorized dot product,
+    so only the best candidates are sent to the LLM.
+    """
+
+    def __init__(self, embeddings: Embeddings, imgflip_api: ImgflipAPI, box_count: int = 2):
+        self.embeddings = embeddings
+        # Template texts rarely change, so their vectors come from the persistent cache
+        self.document_embeddings = CachedEmbeddings(embeddings)
+        self.imgflip_api = imgflip_api
+        self.box_count = box_count
+        self._templates: List[Dict] = []
+        self._matrix: Optional[np.ndarray] = None
+        # The catalog list the matrix was built from; a refresh replaces the list
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def template_text(template: Dict) -> str:
+        usage = TEMPLATE_USAGE.get(template["name"])
+        return f"{template['name']}: {usage}" if usage else template["name"]
+
+    def ensure_built(self) -> None:
+        """(Re)build the matrix when the template catalog has changed"""
+        catalog = self.imgflip_api.get_meme_templates()
+        with self._lock:
+            if self._catalog is catalog:
+                return
+            templates = self.imgflip_api.get_two_box_templates(self.box_count, catalog)
+            vectors = np.asarray(
+                self.document_embeddings.embed_documents([self.template_text(t) for t in templates]),
+                dtype=np.float32
+            )
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            self._templates, self._matrix, self._catalog = templates, vectors, catalog
+
+    def rank(self, text: str, top_n: int = Config.TEMPLATE_CANDIDATES) -> List[Tuple[Dict, float]]:
+        """Return the top_n templates most similar to text with their cosine similarity, best first"""
+        self.ensure_built()
+        if not self._templates:
+            return []
+        return self._top(self._scores([self.embeddings.embed_query(text)])[0], top_n)
+
+    def rank_many(self, texts: List[str], top_n: int = Config.TEMPLATE_CANDIDATES) -> List[List[Tuple[Dict, float]]]:
+        """rank() for several texts with one embedding request and one matrix product"""
+        self.ensure_built()
+        if not self._templates or not texts:
+            return [[] for _ in texts]
+        scores = self._scores(self.embeddings.embed_documents(texts))
+        return [self._top(row, top_n) for row in scores]
+
+    def _scores(self, vectors: List[List[float]]) -> np.ndarray:
+        queries = np.asarray(vectors, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        return queries @ self._matrix.T
+
+    def _top(self, scores: np.ndarray, top_n: int) -> List[Tuple[Dict, float]]:
+        top_n = min(top_n, len(scores))
+        top = np.argpartition(-scores, top_n - 1)[:top_n]
+        top = top[np.argsort(-scores[top])]
+        return [(self._templates[i], float(scores[i])) for i in top]
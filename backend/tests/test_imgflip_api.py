@@ -0,0 +1,112 @@
+"""Offline tests of the template store against a seeded catalog and image cache"""
+import hashlib
+import json
+import os
+import time
+
+import pytest
+import requests
+
+import imgflip_api
+from imgflip_api import CATALOG_RETRY_INTERVAL, ImgflipAPI
+
+TEMPLATE = {"id": "181913649", "name": "Drake Hotline Bling", "box_count": 2,
+            "url": "https://i.imgflip.com/30b1gx.jpg", "width": 1200, "height": 1200}
+IMAGE = b"\xff\xd8\xff\xe0seeded-template-image"
+
+
+class FakeResponse:
+    def __init__(self, memes):
+        self.memes = memes
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"success": True, "data": {"memes": self.memes}}
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Fail any HTTP request; tests swap in responses where they expect one"""
+    def no_network(url, **kwargs):
+        raise requests.ConnectionError(f"offline: {url}")
+    monkeypatch.setattr(imgflip_api.requests, "get", no_network)
+
+
+def seed(cache_dir, fetched_at, memes=(TEMPLATE,)):
+    """Write a catalog fetched at `fetched_at` and a cached image of TEMPLATE"""
+    file_name = hashlib.sha256(IMAGE).hexdigest() + ".jpg"
+    os.makedirs(os.path.join(cache_dir, "images"))
+    with open(os.path.join(cache_dir, "images", file_name), "wb") as f:
+        f.write(IMAGE)
+    with open(os.path.join(cache_dir, "images.json"), "w", encoding="utf-8") as f:
+        json.dump({TEMPLATE["url"]: {"file": file_name, "size": len(IMAGE), "used": fetched_at}}, f)
+    with open(os.path.join(cache_dir, "catalog.json"), "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": fetched_at, "memes": list(memes)}, f)
+
+
+def test_serves_seeded_catalog_and_images_offline(tmp_path, offline):
+    seed(str(tmp_path), time.time())
+    api = ImgflipAPI(cache_dir=str(tmp_path), catalog_ttl=3600)
+
+    assert api.get_meme_templates() == [TEMPLATE]
+    assert api.get_two_box_templates() == [TEMPLATE]
+    with open(api.get_template_image(TEMPLATE["url"]), "rb") as f:
+        assert f.read() == IMAGE
+    assert api.warm_up() == 1
+
+
+def test_serves_stale_catalog_when_unreachable(tmp_path, offline):
+    seed(str(tmp_path), time.time() - 7200)
+    api = ImgflipAPI(cache_dir=str(tmp_path), catalog_ttl=3600)
+
+    assert api.get_meme_templates() == [TEMPLATE]
+
+
+def test_refreshes_in_memory_catalog_after_ttl(tmp_path, offline, monkeypatch):
+    seed(str(tmp_path), time.time())
+    api = ImgflipAPI(cache_dir=str(tmp_path), catalog_ttl=3600)
+    assert api.get_meme_templates() == [TEMPLATE]
+
+    refreshed = [dict(TEMPLATE, name="Refreshed")]
+    monkeypatch.setattr(imgflip_api.requests, "get", lambda url, **kwargs: FakeResponse(refreshed))
+    now = time.time()
+    monkeypatch.setattr(imgflip_api.time, "time", lambda: now + 3601)
+
+    assert api.get_meme_templates() == refreshed
+    with open(os.path.join(str(tmp_path), "catalog.json"), encoding="utf-8") as f:
+        assert json.load(f)["memes"] == refreshed
+
+
+def test_retries_unreachable_api_after_interval(tmp_path, offline, monkeypatch):
+    seed(str(tmp_path), time.time() - 7200)
+    api = ImgflipAPI(cache_dir=str(tmp_path), catalog_ttl=3600)
+    calls = []
+
+    def unreachable(url, **kwargs):
+        calls.append(url)
+        raise requests.ConnectionError("offline")
+    monkeypatch.setattr(imgflip_api.requests, "get", unreachable)
+    now = time.time()
+    monkeypatch.setattr(imgflip_api.time, "time", lambda: now)
+
+    api.get_meme_templates()
+    api.get_meme_templates()
+    assert len(calls) == 1
+
+    monkeypatch.setattr(imgflip_api.time, "time", lambda: now + CATALOG_RETRY_INTERVAL + 1)
+    api.get_meme_templates()
+    assert len(calls) == 2
+
+
+def test_digest_follows_refreshed_catalog(tmp_path, offline, monkeypatch):
+    seed(str(tmp_path), time.time())
+    api = ImgflipAPI(cache_dir=str(tmp_path), catalog_ttl=3600)
+    assert json.loads(api.get_template_digest())[0]["name"] == TEMPLATE["name"]
+
+    refreshed = [dict(TEMPLATE, name="Refreshed")]
+    monkeypatch.setattr(imgflip_api.requests, "get", lambda url, **kwargs: FakeResponse(refreshed))
+    api.get_meme_templates(force_refresh=True)
+
+    assert json.loads(api.get_template_digest())[0]["name"] == "Refreshed"
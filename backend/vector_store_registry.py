@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from compact_vector_store import INDEX_FILE, STORE_FILES, load_compact
+from config import Config
+
+
+class VectorStoreRegistry:
+    """
+    Registry of per-chat FAISS indexes stored under `root/<chat_id>`.
+
+    Indexes are loaded lazily on first use, memory-mapped and read-only, and
+    kept in an in-memory LRU whose total size (measured by the on-disk size
+    of each index) stays within `max_bytes`. The most recently used index is
+    always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, embeddings: Embeddings, root: str = Config.VECTOR_STORE_PATH, max_bytes: int = Config.VECTOR_STORE_CACHE_MAX_BYTES):
+        self.embeddings = embeddings
+        self.root = root
+        self.max_bytes = max_bytes
+        self._stores: "OrderedDict[str, tuple]" = OrderedDict()  # chat_id -> (store, size)
+        self._lock = threading.Lock()
+
+    def path_for(self, chat_id: str) -> str:
+        """Directory of a chat's index"""
+        if not chat_id or os.sep in chat_id or chat_id.startswith("."):
+            raise ValueError(f"Invalid chat id: {chat_id!r}")
+        return os.path.join(self.root, chat_id)
+
+    def exists(self, chat_id: str) -> bool:
+        try:
+            return os.path.exists(os.path.join(self.path_for(chat_id), INDEX_FILE))
+        except ValueError:
+            return False
+
+    def _index_size(self, chat_id: str) -> int:
+        path = self.path_for(chat_id)
+        return sum(
+            os.path.getsize(os.path.join(path, name))
+            for name in STORE_FILES if os.path.exists(os.path.join(path, name))
+        )
+
+    def get(self, chat_id: str) -> Optional[FAISS]:
+        """Return the chat's index, loading it from disk if it isn't resident"""
+        with self._lock:
+            if chat_id in self._stores:
+                self._stores.move_to_end(chat_id)
+                return self._stores[chat_id][0]
+            if not self.exists(chat_id):
+                return None
+            store = load_compact(self.path_for(chat_id), self.embeddings, mmap=True)
+            self._stores[chat_id] = (store, self._index_size(chat_id))
+            self._evict()
+            return store
+
+    def invalidate(self, chat_id: str) -> None:
+        """Drop a resident index so the next get() reloads it, e.g. after re-ingestion"""
+        with self._lock:
+            self._stores.pop(chat_id, None)
+
+    def warm_up(self) -> int:
+        """Load the most recently ingested indexes that fit in the byte budget; returns how many were loaded"""
+        if not os.path.isdir(self.root):
+            return 0
+        chat_ids = sorted(
+            (name for name in os.listdir(self.root) if self.exists(name)),
+            key=lambda name: os.path.getmtime(os.path.join(self.root, name, INDEX_FILE)),
+            reverse=True
+        )
+        loaded = 0
+        for chat_id in chat_ids:
+            if loaded and self.resident_bytes() + self._index_size(chat_id) > self.max_bytes:
+                break
+            self.get(chat_id)
+            loaded += 1
+        return loaded
+
+    def resident_bytes(self) -> int:
+        return sum(size for _, size in self._stores.values())
+
+    def _evict(self) -> None:
+        while len(self._stores) > 1 and self.resident_bytes() > self.max_bytes:
+            self._stores.popitem(last=False)
+
+
+_shared_registry: Optional[VectorStoreRegistry] = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_shared_registry(embeddings: Embeddings) -> VectorStoreRegistry:
+    """Process-wide registry, so every handler (and Streamlit rerun) shares loaded indexes"""
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = VectorStoreRegistry(embeddings)
+        return _shared_registry
@@ -1,9 +1,87 @@
+import codecs
 import re
+import zipfile
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from functools import lru_cache
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Union
 from langchain.schema import Document
 
+# A chat export: a file path, or a binary file object, of a .txt export or a .zip holding one
+ChatSource = Union[str, BinaryIO]
+
+@lru_cache(maxsize=65536)
+def _minute_from_export(prefix: str) -> datetime:
+    """Decode a 'DD/MM/YYYY, HH:MM' prefix; memoized since many messages share a minute"""
+    return datetime(
+        int(prefix[6:10]), int(prefix[3:5]), int(prefix[0:2]),
+        int(prefix[12:14]), int(prefix[15:17])
+    )
+
+def parse_export_timestamp(timestamp_str: str) -> datetime:
+    """
+    Decode a WhatsApp export timestamp ('DD/MM/YYYY, HH:MM:SS') by slicing its
+    fixed-width fields, equivalent to strptime with "%d/%m/%Y, %H:%M:%S".
+    Raises ValueError if the string does not have that layout.
+    """
+    if len(timestamp_str) != 20 or timestamp_str[10:12] != ", ":
+        raise ValueError(f"Invalid export timestamp: {timestamp_str!r}")
+    return _minute_from_export(timestamp_str[:17]).replace(second=int(timestamp_str[18:20]))
+
+@lru_cache(maxsize=65536)
+def _minute_from_iso(prefix: str) -> datetime:
+    """Decode a 'YYYY-MM-DD HH:MM' prefix; memoized since many messages share a minute"""
+    return datetime(
+        int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]),
+        int(prefix[11:13]), int(prefix[14:16])
+    )
+
+def parse_iso_timestamp(timestamp_str: str) -> datetime:
+    """
+    Decode a 'YYYY-MM-DD HH:MM:SS' timestamp (the format of str(WhatsAppMessage))
+    by slicing its fixed-width fields, equivalent to strptime with "%Y-%m-%d %H:%M:%S".
+    Raises ValueError if the string does not have that layout.
+    """
+    if len(timestamp_str) != 19 or timestamp_str[10] != " ":
+        raise ValueError(f"Invalid timestamp: {timestamp_str!r}")
+    return _minute_from_iso(timestamp_str[:16]).replace(second=int(timestamp_str[17:19]))
+
+@contextmanager
+def open_chat_export(source: ChatSource) -> Iterator[BinaryIO]:
+    """
+    Open the text of a chat export as a binary stream. For a .zip export, the
+    first .txt member is streamed from the archive (zip exports hold _chat.txt
+    next to the media), so nothing is extracted to disk or read into memory.
+    File objects are read from their current position and left open.
+    """
+    f = open(source, "rb") if isinstance(source, str) else source
+    try:
+        start = f.tell()
+        is_zip = zipfile.is_zipfile(f)
+        f.seek(start)
+        if not is_zip:
+            yield f
+            return
+        with zipfile.ZipFile(f) as archive:
+            txt_members = [name for name in archive.namelist() if name.lower().endswith(".txt")]
+            if not txt_members:
+                raise ValueError("No text file found in the zip archive")
+            with archive.open(txt_members[0]) as member:
+                yield member
+    finally:
+        if f is not source:
+            f.close()
+
+def decode_lines(stream: BinaryIO, encoding: str = "utf-8-sig") -> Iterator[str]:
+    """Decode a binary stream line by line with an incremental decoder, holding one line at a time"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for raw_line in stream:
+        yield decoder.decode(raw_line)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
 @dataclass
 class WhatsAppMessage:
     """A WhatsApp message with timestamp, sender and content"""
@@ -44,7 +122,10 @@ class WhatsAppMessageHandler:
             return None
             
         timestamp_str, sender, content = match.groups()
-        
+        return self._build_message(timestamp_str, sender, content)
+    
+    def _build_message(self, timestamp_str: str, sender: str, content: str) -> WhatsAppMessage:
+        """Build a message from the fields of an already matched line"""
         # Check if it's a media message
         media_match = self.media_pattern.search(content)
         message_type = "text"
@@ -52,34 +133,43 @@ class WhatsAppMessageHandler:
             message_type = media_match.group().lower().split()[0]
             
         return WhatsAppMessage(
-            timestamp=datetime.strptime(timestamp_str, "%d/%m/%Y, %H:%M:%S"),
+            timestamp=parse_export_timestamp(timestamp_str),
             sender=sender.strip(),
             content=content.strip(),
             message_type=message_type
         )
     
-    def parse_chat_file(self, file_path: str) -> List[WhatsAppMessage]:
+    def iter_chat_file(self, source: ChatSource) -> Iterator[WhatsAppMessage]:
+        """
+        Lazily parse a WhatsApp chat export, yielding messages one at a time.
+        The source is a path or a binary file object of the .txt export or of
+        a .zip export, whose .txt member is decompressed and decoded as it is read.
+        """
+        with open_chat_export(source) as f:
+            yield from self.iter_chat_lines(decode_lines(f))
+    
+    def iter_chat_lines(self, lines: Iterable[str]) -> Iterator[WhatsAppMessage]:
+        """
+        Parse the lines of a chat export, yielding messages one at a time.
+        Each line is matched against the message pattern exactly once; continuation
+        lines of multi-line messages are appended to the pending message content.
+        """
+        pending = None  # (timestamp_str, sender, [content parts])
+        for line in lines:
+            line = line.strip()
+            match = self.message_pattern.match(line)
+            if match:
+                if pending:
+                    yield self._build_message(pending[0], pending[1], " ".join(pending[2]))
+                timestamp_str, sender, content = match.groups()
+                pending = (timestamp_str, sender, [content])
+            elif line and pending:  # Handle multi-line messages
+                pending[2].append(line)
+        
+        # Handle last message
+        if pending:
+            yield self._build_message(pending[0], pending[1], " ".join(pending[2]))
+    
+    def parse_chat_file(self, source: ChatSource) -> List[WhatsAppMessage]:
         """Parse a WhatsApp chat export file"""
-        messages = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            current_message = []
-            for line in f:
-                line = line.strip()
-                if self.message_pattern.match(line):
-                    if current_message:
-                        msg = self.parse_message(" ".join(current_message))
-                        if msg:
-                            messages.append(msg)
-                        current_message = []
-                    current_message.append(line)
-                elif line:  # Handle multi-line messages
-                    current_message.append(line)
-            
-            # Handle last message
-            if current_message:
-                msg = self.parse_message(" ".join(current_message))
-                if msg:
-                    messages.append(msg)
-                    
-        return messages
-        
\ No newline at end of file
+        return list(self.iter_chat_file(source))
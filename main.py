@@ -1,15 +1,11 @@
 import streamlit as st
 import os
 import sys
-import tempfile
-from PIL import Image
-from datetime import datetime
-import zipfile
-import io
 
 # Add backend to Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from backend.chat_flow_handler import ChatFlowHandler
+from backend.whatsapp_handler import parse_iso_timestamp
 
 st.set_page_config(
     page_title="WhatsApp Meme Generator",
@@ -34,7 +30,7 @@ def format_chat_message(message):
         content = remaining[name_end+1:].strip()
         
         # Format timestamp for display
-        timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
+        timestamp = parse_iso_timestamp(timestamp_str)
         display_time = timestamp.strftime("%H:%M")
         
         return {
@@ -98,14 +94,6 @@ def display_chat_chunk(chunk_content, metadata, index):
     
     st.markdown("---")
 
-def extract_txt_from_zip(zip_content):
-    """Extract the first .txt file found in the zip archive"""
-    with zipfile.ZipFile(io.BytesIO(zip_content)) as zip_ref:
-        txt_files = [f for f in zip_ref.namelist() if f.lower().endswith('.txt')]
-        if not txt_files:
-            return None
-        return zip_ref.read(txt_files[0])
-
 def main():
     # Initialize session state
     if 'chat_handler' not in st.session_state:
@@ -129,32 +117,16 @@ def main():
     uploaded_file = st.file_uploader("Choose a WhatsApp chat export file", type=['txt', 'zip'])
     
     if uploaded_file:
-        # Create a temporary file to store the upload
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.txt') as tmp_file:
-            if uploaded_file.type == "application/zip":
-                # Extract text content from zip
-                txt_content = extract_txt_from_zip(uploaded_file.read())
-                if txt_content is None:
-                    st.error("No text file found in the zip archive")
+        if st.button("Process Chat"):
+            with st.spinner("Processing chat file..."):
+                # The .txt export, or the .txt member of a .zip, is parsed straight from the upload
+                uploaded_file.seek(0)
+                success = st.session_state.chat_handler.process_uploaded_chat(uploaded_file)
+                if success:
+                    st.session_state.processing_complete = True
+                    st.success("Chat processed successfully!")
                 else:
-                    tmp_file.write(txt_content)
-                    temp_path = tmp_file.name
-            else:
-                # Handle regular text file
-                tmp_file.write(uploaded_file.getvalue())
-                temp_path = tmp_file.name
-            
-            if st.button("Process Chat"):
-                with st.spinner("Processing chat file..."):
-                    success = st.session_state.chat_handler.process_uploaded_chat(temp_path)
-                    if success:
-                        st.session_state.processing_complete = True
-                        st.success("Chat processed successfully!")
-                    else:
-                        st.error("Error processing chat file")
-            
-            # Clean up the temporary file
-            os.unlink(temp_path)
+                    st.error("Error processing chat file")
     
     # Meme generation section
     if st.session_state.processing_complete:
@@ -184,17 +156,15 @@ def main():
                     # Display generated meme
                     with col1:
                         st.subheader("Generated Meme")
-                        image = Image.open(result['meme_path'])
-                        st.image(image, caption="Generated Meme", use_container_width=True)
+                        st.image(result['meme_bytes'], caption="Generated Meme", use_container_width=True)
                         
                         # Add download button
-                        with open(result['meme_path'], "rb") as file:
-                            btn = st.download_button(
-                                label="⬇️ Download Meme",
-                                data=file,
-                                file_name="generated_meme.jpg",
-                                mime="image/jpeg"
-                            )
+                        btn = st.download_button(
+                            label="⬇️ Download Meme",
+                            data=result['meme_bytes'],
+                            file_name=f"generated_meme{result['meme_extension']}",
+                            mime=result['meme_mime']
+                        )
                         
                     # Display context and conversations
                     with col2:
@@ -16,12 +16,14 @@ function App() {
   const [isProcessed, setIsProcessed] = useState(false)
   const [senders, setSenders] = useState<string[]>([])
   const [groupName, setGroupName] = useState<string>('')
+  const [chatId, setChatId] = useState<string>('')
   const [isExplanationVisible, setIsExplanationVisible] = useState(false)
 
   const {
     file,
     dragActive,
     isLoading: fileLoading,
+    progress: fileProgress,
     error: fileError,
     handleDrag,
     handleDrop,
@@ -48,6 +50,7 @@ function App() {
   const handleProcessChatWrapper = useCallback(async () => {
     const result = await handleProcessChat()
     if (result) {
+      setChatId(result.chat_id)
       setSenders(result.senders)
       setGroupName(result.group_name)
       setIsProcessed(true)
@@ -56,9 +59,9 @@ function App() {
   }, [handleProcessChat])
 
   const handleGenerateMemeWrapper = useCallback(async () => {
-    await handleGenerateMeme()
+    await handleGenerateMeme(chatId || undefined)
     setCurrentStep(STEPS.RESULT)
-  }, [handleGenerateMeme])
+  }, [handleGenerateMeme, chatId])
 
   const handleDownloadMeme = useCallback(() => {
     if (generatedMeme) {
@@ -126,6 +129,7 @@ function App() {
           currentStep={currentStep}
           file={file}
           isLoading={fileLoading}
+          progress={fileProgress}
           dragActive={dragActive}
           handleDrag={handleDrag}
           handleDrop={handleDrop}
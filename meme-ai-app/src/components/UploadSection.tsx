@@ -5,6 +5,7 @@ interface UploadSectionProps {
   currentStep: number;
   file: File | null;
   isLoading: boolean;
+  progress?: string | null;
   dragActive: boolean;
   handleDrag: (e: React.DragEvent) => void;
   handleDrop: (e: React.DragEvent) => void;
@@ -16,6 +17,7 @@ export const UploadSection: React.FC<UploadSectionProps> = ({
   currentStep,
   file,
   isLoading,
+  progress,
   dragActive,
   handleDrag,
   handleDrop,
@@ -51,7 +53,7 @@ export const UploadSection: React.FC<UploadSectionProps> = ({
               {isLoading ? (
                 <ChatProcessingIndicator 
                   message="Processing WhatsApp Chat"
-                  subtitle="Analyzing messages and extracting participants... This might take a moment"
+                  subtitle={progress || "Analyzing messages and extracting participants... This might take a moment"}
                 />
               ) : (
                 <button 
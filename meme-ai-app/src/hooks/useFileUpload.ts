@@ -1,15 +1,49 @@
 import { useState } from 'react';
 import JSZip from 'jszip';
 
+interface IngestResult {
+  chat_id: string;
+  senders: string[];
+  group_name: string;
+}
+
+interface IngestStatus {
+  status: 'queued' | 'running' | 'done' | 'failed';
+  stage: 'queued' | 'parsed' | 'chunked' | 'embedding' | 'indexed';
+  progress: { messages?: number; chunks?: number; embedded?: number; total?: number };
+  error: string | null;
+  chat_id?: string;
+  senders?: string[];
+  group_name?: string;
+}
+
+const STATUS_POLL_INTERVAL_MS = 1000;
+
+const describeProgress = ({ stage, progress }: IngestStatus): string => {
+  switch (stage) {
+    case 'parsed':
+      return `Parsed ${progress.messages ?? 0} messages`;
+    case 'chunked':
+      return `Split into ${progress.chunks ?? 0} conversation chunks`;
+    case 'embedding':
+      return `Embedded ${progress.embedded ?? 0}/${progress.total ?? 0} chunks`;
+    case 'indexed':
+      return 'Building the search index';
+    default:
+      return 'Waiting to start...';
+  }
+};
+
 interface UseFileUploadReturn {
   file: File | null;
   dragActive: boolean;
   isLoading: boolean;
+  progress: string | null;
   error: string | null;
   handleDrag: (e: React.DragEvent) => void;
   handleDrop: (e: React.DragEvent) => void;
   handleFileUpload: (e: React.ChangeEvent<HTMLInputElement>) => void;
-  handleProcessChat: () => Promise<{ senders: string[]; group_name: string; } | undefined>;
+  handleProcessChat: () => Promise<IngestResult | undefined>;
   setFile: (file: File | null) => void;
   setError: (error: string | null) => void;
 }
@@ -18,6 +52,7 @@ export const useFileUpload = (apiBaseUrl: string): UseFileUploadReturn => {
   const [file, setFile] = useState<File | null>(null);
   const [dragActive, setDragActive] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
+  const [progress, setProgress] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   const extractTxtFromZip = async (zipFile: File): Promise<File | null> => {
@@ -100,6 +135,26 @@ export const useFileUpload = (apiBaseUrl: string): UseFileUploadReturn => {
     }
   };
 
+  const pollIngestStatus = async (jobId: string): Promise<IngestStatus> => {
+    for (;;) {
+      await new Promise(resolve => setTimeout(resolve, STATUS_POLL_INTERVAL_MS));
+      const response = await fetch(`${apiBaseUrl}/api/ingest-status/${jobId}`);
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => null);
+        throw new Error(errorData?.error || `Error checking chat processing: ${response.statusText}`);
+      }
+
+      const status: IngestStatus = await response.json();
+      if (status.status === 'done') {
+        return status;
+      }
+      if (status.status === 'failed') {
+        throw new Error(status.error || 'Failed to process chat');
+      }
+      setProgress(describeProgress(status));
+    }
+  };
+
   const handleProcessChat = async () => {
     if (!file) return;
 
@@ -120,8 +175,13 @@ export const useFileUpload = (apiBaseUrl: string): UseFileUploadReturn => {
         throw new Error(errorData?.error || `Error processing chat: ${response.statusText}`);
       }
 
-      const data = await response.json();
+      let data = await response.json();
+      // Ingestion runs as a background job, poll it until it finishes
+      if (data.job_id) {
+        data = await pollIngestStatus(data.job_id);
+      }
       return {
+        chat_id: data.chat_id || '',
         senders: data.senders || [],
         group_name: data.group_name || ''
       };
@@ -130,6 +190,7 @@ export const useFileUpload = (apiBaseUrl: string): UseFileUploadReturn => {
       setError(err instanceof Error ? err.message : 'Error processing chat file');
     } finally {
       setIsLoading(false);
+      setProgress(null);
     }
   };
 
@@ -137,6 +198,7 @@ export const useFileUpload = (apiBaseUrl: string): UseFileUploadReturn => {
     file,
     dragActive,
     isLoading,
+    progress,
     error,
     handleDrag,
     handleDrop,
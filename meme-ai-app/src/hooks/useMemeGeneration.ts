@@ -1,5 +1,4 @@
 import { useState } from 'react';
-import { createImageUrlFromHexData } from '../utils/memeUtils';
 
 interface UseMemeGenerationReturn {
   memePrompt: string;
@@ -15,7 +14,7 @@ interface UseMemeGenerationReturn {
   setMemePrompt: (prompt: string) => void;
   handleInputChange: (e: React.ChangeEvent<HTMLTextAreaElement>) => void;
   handleMentionClick: (sender: string) => void;
-  handleGenerateMeme: () => Promise<void>;
+  handleGenerateMeme: (chatId?: string) => Promise<void>;
 }
 
 export const useMemeGeneration = (apiBaseUrl: string): UseMemeGenerationReturn => {
@@ -55,7 +54,7 @@ export const useMemeGeneration = (apiBaseUrl: string): UseMemeGenerationReturn =
     setShowMentions(false);
   };
 
-  const handleGenerateMeme = async () => {
+  const handleGenerateMeme = async (chatId?: string) => {
     setIsLoading(true);
     setError(null);
     try {
@@ -64,16 +63,18 @@ export const useMemeGeneration = (apiBaseUrl: string): UseMemeGenerationReturn =
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ query: memePrompt }),
+        // multipart keeps the image binary instead of hex-encoding it inside JSON
+        body: JSON.stringify({ query: memePrompt, chat_id: chatId, response_mode: 'multipart' }),
       });
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const result = await response.json();
+      const formData = await response.formData();
+      const result = JSON.parse(formData.get('metadata') as string);
       
-      const imageUrl = createImageUrlFromHexData(result.image_data);
+      const imageUrl = URL.createObjectURL(formData.get('image') as Blob);
       setGeneratedMeme(imageUrl);
       
       const processedChunks = result.context_chunks.map((chunk: [string, any]) => ({
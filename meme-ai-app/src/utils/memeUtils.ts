@@ -2,14 +2,6 @@ export const getRandomSender = (senders: string[]): string => {
   return senders[Math.floor(Math.random() * senders.length)] || '';
 };
 
-export const createImageUrlFromHexData = (imageData: string): string => {
-  const byteArray = new Uint8Array(
-    imageData.match(/.{1,2}/g)?.map((byte: string) => parseInt(byte, 16)) || []
-  );
-  const blob = new Blob([byteArray], { type: 'image/jpeg' });
-  return URL.createObjectURL(blob);
-};
-
 export const downloadImage = (imageUrl: string, fileName: string = 'generated-meme.jpg'): void => {
   const link = document.createElement('a');
   link.href = imageUrl;